@@ -1,9 +1,14 @@
 #!/usr/bin/env python3
 
+import argparse
+import mmap
+import multiprocessing
+import os
+import re
 import sys
-from datetime import datetime
 from math import sqrt
-from statistics import mean, pstdev
+
+import numpy as np
 
 try:
     from scipy.stats import kstest, expon
@@ -11,56 +16,261 @@ try:
 except ImportError:
     SCIPY_AVAILABLE = False
 
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+TS_LEN = 23  # YYYY-MM-DD HH:MM:SS,mmm
+BLOCK_SIZE = 1 << 20  # timestamps per inter-event block
+KS_SAMPLE_SIZE = 50000
+PARALLEL_MIN_BYTES = 64 * 1024 * 1024  # below this a process pool costs more than it saves
+
+# one scan for both tags: shared '[' prefix and 'BOUND]' suffix, group 1
+# only participates for INBOUND so m.lastindex tells the two apart
+_KIND_RE = re.compile(rb'\[(?:(IN)|OUT)BOUND\]')
+_INBOUND_TAG = b'[INBOUND]'
+
+
+class RunningStats:
+    # Welford mean/variance of the positive inter-event times, merged block by
+    # block (Chan et al.), plus a reservoir sample for the KS test.
+    __slots__ = ('n', 'mean', 'M2', 'sample', 'seen', '_rng')
+
+    def __init__(self, sample_size=KS_SAMPLE_SIZE):
+        self.n = 0
+        self.mean = 0.0
+        self.M2 = 0.0
+        self.sample = np.empty(sample_size)
+        self.seen = 0
+        # fixed seed so repeated runs on the same log report the same KS result
+        self._rng = np.random.default_rng(42)
+
+    @property
+    def std(self):
+        return sqrt(self.M2 / self.n) if self.n else float('nan')
+
+    def update(self, values):
+        if values.size == 0:
+            return
+
+        # sum and sum of squares in two C-level reductions, without the
+        # (values - mean) temporary a second pass would allocate
+        k = values.size
+        total = values.sum()
+        block_M2 = max(np.dot(values, values) - total * total / k, 0.0)
+        self.merge(k, total / k, block_M2)
+        self.add_to_sample(values)
+
+    def merge(self, k, block_mean, block_M2):
+        if k == 0:
+            return
+
+        n = self.n + k
+        delta = block_mean - self.mean
+        self.mean += delta * k / n
+        self.M2 += block_M2 + delta * delta * self.n * k / n
+        self.n = n
+
+    def add_to_sample(self, values):
+        size = self.sample.size
+        fill = min(max(size - self.seen, 0), values.size)
+        self.sample[self.seen:self.seen + fill] = values[:fill]
+
+        rest = values[fill:]
+        if rest.size:
+            # algorithm R: the i-th value overall replaces a random slot
+            # with probability size / (i + 1)
+            start = self.seen + fill
+            j = self._rng.integers(0, np.arange(start + 1, start + rest.size + 1))
+            keep = j < size
+            self.sample[j[keep]] = rest[keep]
+
+        self.seen += values.size
+
+    def ks_sample(self):
+        return self.sample[:min(self.seen, self.sample.size)]
+
+
+def _positive_intervals(ms, out):
+    # fused diff + filter + Welford pass over epoch milliseconds; the
+    # positive intervals (in seconds) are written to out for the KS sample
+    k = 0
+    mean = 0.0
+    M2 = 0.0
+    for i in range(1, ms.shape[0]):
+        d = (ms[i] - ms[i - 1]) / 1000.0
+        if d > 0:
+            out[k] = d
+            k += 1
+            delta = d - mean
+            mean += delta / k
+            M2 += delta * (d - mean)
+    return k, mean, M2
+
+
+if NUMBA_AVAILABLE:
+    _positive_intervals = njit(cache=True)(_positive_intervals)
+
+
+def to_datetime64(stamps=b''):
+    # stamps is a buffer of back-to-back TS_LEN-byte timestamps, which NumPy
+    # can view as fixed-width strings and cast in one C-level call
+    if len(stamps) % TS_LEN:
+        raise ValueError("event line without a complete timestamp prefix")
+    arr = np.frombuffer(stamps, dtype=f'S{TS_LEN}')
+    if not arr.flags.writeable:
+        arr = arr.copy()
+    # NumPy only understands '.' as the fractional-second separator
+    arr.view(np.uint8).reshape(-1, TS_LEN)[:, 19] = ord('.')
+    return arr.astype('datetime64[ms]')
+
 
-def parse_times(stream):
-    in_times = []
-    out_times = []
+def ensure_sorted(times):
+    # broker logs are written in order; only pay for a sort on real disorder
+    if times.size > 1 and (times[1:] < times[:-1]).any():
+        times.sort()
+    return times
+
+
+def parse_times(stream, verbose=False):
+    in_stamps = bytearray()
+    out_stamps = bytearray()
 
-    counter = 0
     count = 0
 
     print("begin parsing")
 
-    for line in stream:
-        if '[INBOUND]' in line or '[OUTBOUND]' in line:
-            ts = line[:23]  # YYYY-MM-DD HH:MM:SS,mmm
-            t = datetime.strptime(ts, "%Y-%m-%d %H:%M:%S,%f")
+    for count, line in enumerate(stream, 1):
+        m = _KIND_RE.search(line)
+        if m is not None:
+            # a line with an [INBOUND] tag anywhere is an arrival, even after an [OUTBOUND]
+            if m.lastindex == 1 or line.find(_INBOUND_TAG, m.end()) != -1:
+                in_stamps += line[:TS_LEN]
+            else:
+                out_stamps += line[:TS_LEN]
+        if verbose and (count & 0x3FFF) == 0:
+            sys.stderr.write(f"parsed {count} lines\n")
+
+    print(f"parsed {count} lines")
+
+    return ensure_sorted(to_datetime64(in_stamps)), ensure_sorted(to_datetime64(out_stamps))
+
+
+def _open_mmap(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        if os.fstat(fd).st_size == 0:
+            return None
+        return mmap.mmap(fd, 0, access=mmap.ACCESS_READ)
+    finally:
+        os.close(fd)
+
+
+def _line_start(mm, pos):
+    # first line boundary at or after pos
+    if pos <= 0:
+        return 0
+    nl = mm.find(b'\n', pos - 1)
+    return len(mm) if nl == -1 else nl + 1
+
+
+def _parse_range(args):
+    path, begin, end = args
+    in_stamps = bytearray()
+    out_stamps = bytearray()
+
+    mm = _open_mmap(path)
+    if mm is None:
+        return to_datetime64(in_stamps), to_datetime64(out_stamps)
 
-            if '[INBOUND]' in line:
-                in_times.append(t)
+    try:
+        # sweep the range for the tags and step back to the start of each
+        # matching line, so non-event lines are never touched in Python
+        last_start = -1
+        for m in _KIND_RE.finditer(mm, begin, end):
+            start = mm.rfind(b'\n', 0, m.start()) + 1
+            if start == last_start:
+                continue  # the line was classified at its first tag
+            last_start = start
+
+            # same INBOUND-first rule as parse_times
+            inbound = m.lastindex == 1
+            if not inbound:
+                eol = mm.find(b'\n', m.end(), end)
+                inbound = mm.find(_INBOUND_TAG, m.end(), end if eol == -1 else eol) != -1
+            if inbound:
+                in_stamps += mm[start:start + TS_LEN]
             else:
-                out_times.append(t)
-        counter += 1
-        if counter >= 20000:
-            count += counter
-            print(f"parsed {count} lines")
-            counter = 0
+                out_stamps += mm[start:start + TS_LEN]
+    finally:
+        mm.close()
+
+    return to_datetime64(in_stamps), to_datetime64(out_stamps)
+
 
-    return sorted(in_times), sorted(out_times)
+def parse_times_mmap(path, jobs=1):
+    print("begin parsing")
+
+    mm = _open_mmap(path)
+    if mm is None:
+        return to_datetime64(), to_datetime64()
+
+    try:
+        size = len(mm)
+        if size < PARALLEL_MIN_BYTES:
+            jobs = 1
+        # newline-aligned byte ranges, one per worker
+        bounds = sorted({_line_start(mm, size * i // jobs) for i in range(jobs)} | {size})
+    finally:
+        mm.close()
+
+    ranges = [(path, b, e) for b, e in zip(bounds, bounds[1:])]
+    if len(ranges) == 1:
+        results = [_parse_range(ranges[0])]
+    else:
+        with multiprocessing.Pool(len(ranges)) as pool:
+            results = pool.map(_parse_range, ranges)
+
+    # ranges are in file order, so concatenating keeps the log order
+    in_times = np.concatenate([r[0] for r in results])
+    out_times = np.concatenate([r[1] for r in results])
+    return ensure_sorted(in_times), ensure_sorted(out_times)
 
 
 def rate(times):
     if len(times) < 2:
         return 0.0
-    duration = (times[-1] - times[0]).total_seconds()
+    duration = (times[-1] - times[0]) / np.timedelta64(1, 's')
     return len(times) / duration if duration > 0 else 0.0
 
 
 def inter_event_times(times):
-    return [
-        (t2 - t1).total_seconds()
-        for t1, t2 in zip(times, times[1:])
-        if (t2 - t1).total_seconds() > 0
-    ]
+    stats = RunningStats()
+    buf = np.empty(min(len(times), BLOCK_SIZE)) if NUMBA_AVAILABLE else None
+    # overlap blocks by one timestamp so no interval is lost at the seams
+    for start in range(1, len(times), BLOCK_SIZE):
+        block = times[start - 1:start + BLOCK_SIZE]
+        if NUMBA_AVAILABLE:
+            k, block_mean, block_M2 = _positive_intervals(block.view(np.int64), buf)
+            stats.merge(k, block_mean, block_M2)
+            stats.add_to_sample(buf[:k])
+        else:
+            # plain integer subtraction on epoch ms; only positive deltas
+            # are converted to float seconds
+            deltas = np.diff(block.view(np.int64))
+            stats.update(deltas[deltas > 0] / 1000.0)
+    return stats
 
 
-def summarize_intervals(name, intervals, rate_est):
-    if not intervals:
+def summarize_intervals(name, stats, rate_est):
+    if stats.n == 0:
         print(f"{name}: insufficient data")
         return
 
-    m = mean(intervals)
-    sd = pstdev(intervals)
+    m = stats.mean
+    sd = stats.std
     cv = sd / m if m > 0 else float('nan')
 
     print(f"{name}:")
@@ -69,7 +279,10 @@ def summarize_intervals(name, intervals, rate_est):
     print(f"  coefficient of var = {cv:.3f}")
 
     if SCIPY_AVAILABLE:
-        D, p = kstest(intervals, expon(scale=1 / rate_est).cdf)
+        sample = stats.ks_sample()
+        D, p = kstest(sample, expon(scale=1 / rate_est).cdf)
+        if sample.size < stats.n:
+            print(f"  KS test sample     = {sample.size:,} of {stats.n:,} intervals (reservoir)")
         print(f"  KS test D          = {D:.4f}")
         print(f"  KS test p-value    = {p:.4f}")
     else:
@@ -77,7 +290,19 @@ def summarize_intervals(name, intervals, rate_est):
 
 
 def main():
-    in_times, out_times = parse_times(sys.stdin)
+    parser = argparse.ArgumentParser(description="Estimate arrival/service rates from a broker log.")
+    parser.add_argument("log_file", nargs="?",
+                        help="broker log to analyze (memory-mapped); reads stdin if omitted")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="worker processes for parsing a log file (default: CPU count)")
+    parser.add_argument("-v", "--verbose", action="store_true",
+                        help="report parsing progress on stderr")
+    args = parser.parse_args()
+
+    if args.log_file:
+        in_times, out_times = parse_times_mmap(args.log_file, max(args.jobs, 1))
+    else:
+        in_times, out_times = parse_times(sys.stdin.buffer, args.verbose)
 
     lam = rate(in_times)
     mu = rate(out_times)
@@ -13,11 +13,16 @@ Features:
 - PDF chart generation with experiment type detection
 """
 
+import mmap
 import re
 import typer
 from pathlib import Path
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 from typing import Dict, List, Tuple
+import matplotlib
+matplotlib.use('Agg')  # Charts are only written to files; skip loading a GUI backend
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
@@ -31,68 +36,131 @@ import glob
 class FileData:
     """Data class to store parsed data from a single log file."""
     file_path: Path
-    response_times: Dict[str, List[float]]
+    response_times: Dict[str, np.ndarray]  # float32 response times (ms) per request type
     error_stats: 'ErrorStats'
     file_label: str  # Human-readable label for the file
     # For scatter plot functionality
-    response_timestamps: Dict[str, List[float]] = None  # Relative time in seconds from start
+    response_timestamps: Dict[str, np.ndarray] = None  # Relative time in seconds from start
     error_timestamps: List[float] = None  # Timestamps of all errors
     start_time: float = None  # Start timestamp of the log file
 
-@dataclass
 class ErrorStats:
-    """Data class to track different types of errors."""
-    # HTTP Status Code Errors
-    http_500_errors: int = 0  # Internal Server Error
-    http_502_errors: int = 0  # Bad Gateway
-    http_503_errors: int = 0  # Service Unavailable
-    
-    # Functional Errors
-    login_errors: int = 0     # Login related errors
-    logout_errors: int = 0    # Logout related errors
-    profile_errors: int = 0   # Profile access errors
-    product_errors: int = 0   # Product access/cart errors
-    category_errors: int = 0  # Category browsing errors
-    page_load_errors: int = 0 # Page loading errors
-    
-    # Legacy error types (for backward compatibility)
-    timeout_errors: int = 0
-    unknown_errors: int = 0
-    connection_errors: int = 0
-    other_errors: int = 0
+    """Tracks error counts per category.
+
+    Counts live in a single defaultdict keyed by category name ('http_500', 'login', ...),
+    so recording an error is one dict increment. The former per-category fields are still
+    readable as attributes, e.g. ``error_stats.http_500_errors``.
+    """
+    HTTP_CATEGORIES = ('http_500', 'http_502', 'http_503')
+    FUNCTIONAL_CATEGORIES = ('login', 'logout', 'profile', 'product', 'category', 'page_load')
+    
+    # Report labels in display order
+    LABELS = {
+        'http_503': 'HTTP 503 (Service Unavailable)',
+        'http_502': 'HTTP 502 (Bad Gateway)',
+        'http_500': 'HTTP 500 (Internal Server)',
+        'login': 'Login Errors',
+        'logout': 'Logout Errors',
+        'profile': 'Profile Access Errors',
+        'product': 'Product/Cart Errors',
+        'category': 'Category Browse Errors',
+        'page_load': 'Page Load Errors',
+        'timeout': 'Timeout Errors',
+        'unknown': 'Unknown/Empty Errors',
+        'connection': 'Connection Errors',
+        'other': 'Other Errors',
+    }
+    
+    def __init__(self):
+        self._counts = defaultdict(int)
+    
+    def __getattr__(self, name: str) -> int:
+        # Backward compatible access to the old '<category>_errors' fields
+        category = name[:-len('_errors')] if name.endswith('_errors') else None
+        if category in ErrorStats.LABELS:
+            return self._counts[category]
+        raise AttributeError(f"'ErrorStats' object has no attribute '{name}'")
+    
+    def __repr__(self) -> str:
+        return f"ErrorStats({dict(self._counts)})"
+    
+    def record(self, category: str) -> None:
+        self._counts[category] += 1
     
     @property
     def total_errors(self) -> int:
-        return (self.http_500_errors + self.http_502_errors + self.http_503_errors +
-                self.login_errors + self.logout_errors + self.profile_errors +
-                self.product_errors + self.category_errors + self.page_load_errors +
-                self.timeout_errors + self.unknown_errors + self.connection_errors + self.other_errors)
+        return sum(self._counts.values())
     
     @property
     def total_http_errors(self) -> int:
-        return self.http_500_errors + self.http_502_errors + self.http_503_errors
+        return sum(self._counts[c] for c in self.HTTP_CATEGORIES)
     
     @property 
     def total_functional_errors(self) -> int:
-        return (self.login_errors + self.logout_errors + self.profile_errors +
-                self.product_errors + self.category_errors + self.page_load_errors)
+        return sum(self._counts[c] for c in self.FUNCTIONAL_CATEGORIES)
     
     def to_dict(self) -> Dict[str, int]:
-        return {
-            'HTTP 503 (Service Unavailable)': self.http_503_errors,
-            'HTTP 502 (Bad Gateway)': self.http_502_errors,
-            'HTTP 500 (Internal Server)': self.http_500_errors,
-            'Login Errors': self.login_errors,
-            'Logout Errors': self.logout_errors,
-            'Profile Access Errors': self.profile_errors,
-            'Product/Cart Errors': self.product_errors,
-            'Category Browse Errors': self.category_errors,
-            'Page Load Errors': self.page_load_errors,
-            'Timeout Errors': self.timeout_errors,
-            'Unknown/Empty Errors': self.unknown_errors,
-            'Connection Errors': self.connection_errors,
-            'Other Errors': self.other_errors
-        }
+        return {label: self._counts[category] for category, label in self.LABELS.items()}
+
+# Error categories in precedence order. Every alternative is a lookahead anchored at the
+# start of the message, so the first category whose keywords occur anywhere in the message
+# wins -- the same result as a chain of substring tests, but in a single match() call.
+# Keyword tests are case-insensitive (ASCII case folding only, the keywords are all ASCII),
+# the HTTP status tests are case-sensitive.
+ERROR_CATEGORY_PATTERN = re.compile(
+    r'(?P<timeout>(?=.*timed out))'
+    r'|(?P<connection>(?=.*(?:connection|connect|refused|reset|closed)))'
+    r'|(?P<http_500>(?=.*(?-i:status:? 500)))'
+    r'|(?P<http_502>(?=.*(?-i:status:? 502)))'
+    r'|(?P<http_503>(?=.*(?-i:status:? 503)))'
+    r'|(?P<login>(?=.*login)(?=.*username))'
+    r'|(?P<logout>(?=.*log ?out))'
+    r'|(?P<profile>(?=.*profile))'
+    r'|(?P<product>(?=.*(?:product|cart)))'
+    r'|(?P<category>(?=.*category))'
+    r'|(?P<page_load>(?=.*load)(?=.*(?:page|landing)))',
+    re.IGNORECASE | re.ASCII
+)
+
+# Display label for each category group name
+ERROR_CATEGORIES = {
+    'timeout': "Timeout",
+    'connection': "Connection",
+    'http_500': "HTTP 500",
+    'http_502': "HTTP 502",
+    'http_503': "HTTP 503",
+    'login': "Login",
+    'logout': "Logout",
+    'profile': "Profile",
+    'product': "Product/Cart",
+    'category': "Category",
+    'page_load': "Page Load",
+}
+
+# Log line patterns, compiled once and shared by all parse_log_file() calls. They run over the
+# raw bytes of the memory-mapped log. Whitespace inside a match is written as [^\S\n] so that
+# no match can run on into the next line.
+
+# Pattern to match response time lines in INFO logs, anchored at the line start so a single
+# match() yields timestamp and payload: [timestamp] host/INFO/root: (METHOD endpoint) Response time X ms
+RESPONSE_PATTERN = re.compile(rb'\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3})\] \S*?/INFO/root:[^\S\n]+'
+                              rb'\(([A-Z]+[^\S\n]+\w+)\)[^\S\n]+Response[^\S\n]+time[^\S\n]+(\d+)[^\S\n]+ms')
+
+# Pattern for worker log files: Response time X ms (request type is always "Alarm");
+# every response line contains it, so it also locates the response lines in the file
+WORKER_RESPONSE_PATTERN = re.compile(rb'Response[^\S\n]+time[^\S\n]+(\d+)[^\S\n]+ms')
+
+# Pattern to match error lines and capture the error message (bounded to the current line)
+ERROR_PATTERN = re.compile(rb'ERROR/root: user\d+: ([^\n]*)')
+
+# Pattern to extract the timestamp at the start of a log line
+TIMESTAMP_PATTERN = re.compile(rb'^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3})\]', re.MULTILINE)
+
+# Pattern for the log line that ends the warm-up phase
+WARMUP_PATTERN = re.compile(rb'Warm-Up finished[^\n]*Regular load profile starts', re.IGNORECASE)
+
+# Points per scatter subplot from which publication output rasterizes the markers
+SCATTER_RASTERIZE_MIN_POINTS = 250_000
 
 app = typer.Typer()
 
@@ -236,6 +304,16 @@ def cleanup_temp_files(temp_files: List[Path]):
         except Exception as e:
             typer.echo(f"Warning: Could not clean up {temp_file}: {e}")
 
+def parse_log_file_in_worker(file_path: Path):
+    """
+    parse_log_file for a worker process. typer.Exit does not keep its exit code when
+    pickled back to the parent, so a failed parse is returned as None instead.
+    """
+    try:
+        return parse_log_file(file_path)
+    except typer.Exit:
+        return None
+
 def parse_multiple_log_files(log_files: List[Path]) -> List[FileData]:
     """
     Parse multiple log files and return a list of FileData objects.
@@ -251,7 +329,18 @@ def parse_multiple_log_files(log_files: List[Path]) -> List[FileData]:
     
     for log_file in log_files:
         typer.echo(f"Parsing {log_file.name}...")
-        response_times, error_stats, response_timestamps, error_timestamps, start_time = parse_log_file(log_file)
+    
+    # Files are independent, so parse them in parallel; map() keeps the file order
+    if len(log_files) > 1:
+        with ProcessPoolExecutor(max_workers=min(len(log_files), os.cpu_count() or 1)) as executor:
+            parse_results = list(executor.map(parse_log_file_in_worker, log_files))
+        if any(parse_result is None for parse_result in parse_results):
+            raise typer.Exit(1)
+    else:
+        parse_results = [parse_log_file(log_file) for log_file in log_files]
+    
+    for log_file, parse_result in zip(log_files, parse_results):
+        response_times, error_stats, response_timestamps, error_timestamps, start_time = parse_result
         
         # Create a human-readable label
         # For consolidated worker log files, extract group_id from filename
@@ -294,7 +383,41 @@ def parse_multiple_log_files(log_files: List[Path]) -> List[FileData]:
     
     return file_data_list
 
-def parse_log_file(file_path: Path) -> Tuple[Dict[str, List[float]], ErrorStats, Dict[str, List[float]], List[float], float]:
+@lru_cache(maxsize=4096)
+def classify_error(raw_message: bytes) -> Tuple[str, str]:
+    """Return the (category, display label) of a raw error message from the log."""
+    # Load tests repeat the same few error messages many times, so the
+    # classification is cached per distinct message
+    error_message = raw_message.decode('utf-8', 'replace').strip()
+    if error_message == "":
+        return 'unknown', "Unknown/Empty"
+    
+    category_match = ERROR_CATEGORY_PATTERN.match(error_message)
+    if category_match:
+        return category_match.lastgroup, ERROR_CATEGORIES[category_match.lastgroup]
+    return 'other', "Other"
+
+
+@lru_cache(maxsize=4096)
+def _parse_timestamp_second(second: bytes) -> float:
+    """Parse a "2025-10-03 18:50:10" timestamp prefix to seconds since epoch."""
+    try:
+        return datetime.strptime(second.decode(), "%Y-%m-%d %H:%M:%S").timestamp()
+    except ValueError:
+        return None
+
+
+def parse_timestamp(timestamp: bytes) -> float:
+    """Parse a log timestamp like b"2025-10-03 18:50:10,744" to seconds since epoch."""
+    # Many lines share the same second, so only the second is parsed (and cached);
+    # the milliseconds are added on top
+    second = _parse_timestamp_second(timestamp[:19])
+    if second is None:
+        return None
+    return second + int(timestamp[20:23]) / 1000.0
+
+
+def parse_log_file(file_path: Path) -> Tuple[Dict[str, np.ndarray], ErrorStats, Dict[str, np.ndarray], List[float], float]:
     """
     Parse the locust log file to extract response times and categorized error counts.
     
@@ -308,131 +431,96 @@ def parse_log_file(file_path: Path) -> Tuple[Dict[str, List[float]], ErrorStats,
     error_stats = ErrorStats()
     start_time = None
     
-    # Pattern to match response time lines in INFO logs: (METHOD endpoint) Response time X ms
-    response_pattern = re.compile(r'/INFO/root:\s+\(([A-Z]+\s+\w+)\)\s+Response\s+time\s+(\d+)\s+ms')
-    
-    # Pattern for worker log files: Response time X ms (request type is always "Alarm")
-    worker_response_pattern = re.compile(r'Response\s+time\s+(\d+)\s+ms')
-    
-    # Pattern to match error lines and capture the error message
-    error_pattern = re.compile(r'ERROR/root: user\d+: (.*)$')
-    
-    # Pattern to extract timestamp from log line
-    timestamp_pattern = re.compile(r'\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2},\d{3})\]')
-   
-    warmup_pattern = re.compile(r'Warm-Up finished.*Regular load profile starts', re.IGNORECASE)
     # For worker logs (consolidated files), skip warmup detection since they don't contain warmup messages
     is_worker_log = "consolidated_" in str(file_path) and "_group_" in str(file_path)
     warmup_finished = is_worker_log  # Start as finished for worker logs
     
-    def parse_timestamp(timestamp_str: str) -> float:
-        """Parse timestamp string to seconds since epoch."""
-        try:
-            # Parse format like "2025-10-03 18:50:10,744"
-            dt = datetime.strptime(timestamp_str, "%Y-%m-%d %H:%M:%S,%f")
-            return dt.timestamp()
-        except ValueError:
-            return None
+    def line_timestamp(mm: mmap.mmap, line_start: int) -> float:
+        """Parse the timestamp leading the line at line_start, if there is one."""
+        timestamp_match = TIMESTAMP_PATTERN.match(mm, line_start)
+        return parse_timestamp(timestamp_match.group(1)) if timestamp_match else None
     
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            for line_num, line in enumerate(file, 1):
+        with open(file_path, 'rb') as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                return {}, error_stats, {}, error_timestamps, start_time
+            
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                # Skip everything up to and including the line that ends the warm-up phase
+                begin = 0
                 if not warmup_finished:
-                    if warmup_pattern.search(line):
-                        warmup_finished = True
-                    continue
-
-                # Extract timestamp from every line
-                timestamp_match = timestamp_pattern.search(line)
-                current_timestamp = None
-                if timestamp_match:
-                    current_timestamp = parse_timestamp(timestamp_match.group(1))
-                    if start_time is None:
-                        start_time = current_timestamp
-
-                # Check for response time entries (original format)
-                response_match = response_pattern.search(line)
-                worker_response_match = worker_response_pattern.search(line)
+                    warmup_match = WARMUP_PATTERN.search(mm)
+                    line_end = mm.find(b'\n', warmup_match.end()) if warmup_match else -1
+                    begin = line_end + 1 if line_end != -1 else len(mm)
+                
+                # Start time is the first parseable line timestamp after the warm-up
+                for timestamp_match in TIMESTAMP_PATTERN.finditer(mm, begin):
+                    start_time = parse_timestamp(timestamp_match.group(1))
+                    if start_time is not None:
+                        break
+                
+                # Local bindings for the hot loops
+                rfind = mm.rfind
+                match_response = RESPONSE_PATTERN.match
+                append_error_timestamp = error_timestamps.append
+                record_error = error_stats.record
                 
-                if response_match:
-                    request_type = response_match.group(1)
-                    response_time = float(response_match.group(2))
-                    response_times[request_type].append(response_time)
+                # Bound append methods of the two lists of each request type, keyed by the raw
+                # request type so it is only decoded once
+                appenders = {}
+                
+                # Response time entries: find each occurrence in one sweep and step back to the
+                # start of its line, which is then matched against the original format
+                response_lines = set()
+                for worker_response_match in WORKER_RESPONSE_PATTERN.finditer(mm, begin):
+                    line_start = rfind(b'\n', 0, worker_response_match.start()) + 1
+                    if line_start in response_lines:
+                        continue  # only the first response time of a line counts
+                    response_lines.add(line_start)
+                    
+                    response_match = match_response(mm, line_start)
+                    if response_match:
+                        raw_request_type = response_match.group(2)
+                        response_time = float(response_match.group(3))
+                        current_timestamp = parse_timestamp(response_match.group(1))
+                    else:
+                        raw_request_type = b"Alarm"  # Worker logs are always for Alarm requests
+                        response_time = float(worker_response_match.group(1))
+                        current_timestamp = line_timestamp(mm, line_start)
                     
-                    # Store relative timestamp for scatter plot
+                    appender = appenders.get(raw_request_type)
+                    if appender is None:
+                        request_type = raw_request_type.decode()
+                        appender = appenders[raw_request_type] = (response_times[request_type].append,
+                                                                  response_timestamps[request_type].append)
+                    append_response_time, append_response_timestamp = appender
+                    append_response_time(response_time)
+                    
+                    # Store relative timestamp for scatter plot, index-aligned with the response
+                    # times; lines without a usable timestamp get NaN, which matplotlib skips
                     if current_timestamp and start_time:
-                        relative_time = current_timestamp - start_time
-                        response_timestamps[request_type].append(relative_time)
+                        append_response_timestamp(current_timestamp - start_time)
+                    else:
+                        append_response_timestamp(np.nan)
                 
-                # Check for response time entries (worker log format)
-                elif worker_response_match:
-                    request_type = "Alarm"  # Worker logs are always for Alarm requests
-                    response_time = float(worker_response_match.group(1))
-                    response_times[request_type].append(response_time)
+                # Error entries (only on lines without a response time)
+                for error_match in ERROR_PATTERN.finditer(mm, begin):
+                    line_start = rfind(b'\n', 0, error_match.start()) + 1
+                    if line_start in response_lines:
+                        continue
                     
-                    # Store relative timestamp for scatter plot
+                    # Store error timestamp
+                    current_timestamp = line_timestamp(mm, line_start)
                     if current_timestamp and start_time:
-                        relative_time = current_timestamp - start_time
-                        response_timestamps[request_type].append(relative_time)
-                
-                # Check for error entries (only if no response time found)
-                else:
-                    error_match = error_pattern.search(line)
-                    if error_match:
-                        error_message = error_match.group(1).strip()
-                        
-                        # Store error timestamp
-                        if current_timestamp and start_time:
-                            relative_time = current_timestamp - start_time
-                            error_timestamps.append(relative_time)
-                        
-                        # Categorize the error based on the message
-                        error_type = "Unknown"
-                        
-                        if error_message == "":
-                            error_stats.unknown_errors += 1
-                            error_type = "Unknown/Empty"
-                        elif "timed out" in error_message.lower():
-                            error_stats.timeout_errors += 1
-                            error_type = "Timeout"
-                        elif any(conn_keyword in error_message.lower() for conn_keyword in 
-                                ["connection", "connect", "refused", "reset", "closed"]):
-                            error_stats.connection_errors += 1
-                            error_type = "Connection"
-                        # HTTP Status Code categorization
-                        elif "status 500" in error_message or "status: 500" in error_message:
-                            error_stats.http_500_errors += 1
-                            error_type = "HTTP 500"
-                        elif "status 502" in error_message or "status: 502" in error_message:
-                            error_stats.http_502_errors += 1
-                            error_type = "HTTP 502"
-                        elif "status 503" in error_message or "status: 503" in error_message:
-                            error_stats.http_503_errors += 1
-                            error_type = "HTTP 503"
-                        # Functional error categorization
-                        elif "login" in error_message.lower() and "username" in error_message.lower():
-                            error_stats.login_errors += 1
-                            error_type = "Login"
-                        elif "log out" in error_message.lower() or "logout" in error_message.lower():
-                            error_stats.logout_errors += 1
-                            error_type = "Logout"
-                        elif "profile" in error_message.lower():
-                            error_stats.profile_errors += 1
-                            error_type = "Profile"
-                        elif "product" in error_message.lower() or "cart" in error_message.lower():
-                            error_stats.product_errors += 1
-                            error_type = "Product/Cart"
-                        elif "category" in error_message.lower():
-                            error_stats.category_errors += 1
-                            error_type = "Category"
-                        elif "load" in error_message.lower() and ("page" in error_message.lower() or "landing" in error_message.lower()):
-                            error_stats.page_load_errors += 1
-                            error_type = "Page Load"
-                        else:
-                            error_stats.other_errors += 1
-                            error_type = "Other"
-                        
-                        # typer.echo(f"Found {error_type} error at line {line_num}: {line.strip()}")
+                        append_error_timestamp(current_timestamp - start_time)
+                    
+                    # Categorize the error based on the message
+                    category, error_type = classify_error(error_match.group(1))
+                    record_error(category)
+                    
+                    # Line numbers are not tracked during the sweep; recover one only when debugging:
+                    # line_num = mm[:line_start].count(b'\n') + 1
+                    # typer.echo(f"Found {error_type} error at line {line_num}: {error_match.group(1).decode('utf-8', 'replace').strip()}")
     
     except FileNotFoundError:
         typer.echo(f"Error: File '{file_path}' not found.", err=True)
@@ -441,7 +529,26 @@ def parse_log_file(file_path: Path) -> Tuple[Dict[str, List[float]], ErrorStats,
         typer.echo(f"Error reading file: {e}", err=True)
         raise typer.Exit(1)
     
-    return dict(response_times), error_stats, dict(response_timestamps), error_timestamps, start_time
+    # Response times are collected in lists while parsing, then stored compactly as float32
+    # arrays (whole milliseconds are exact in float32)
+    response_times = {k: np.fromiter(v, dtype=np.float32, count=len(v)) for k, v in response_times.items()}
+    # Timestamps become arrays too, so the scatter plot can hand them to matplotlib directly;
+    # request types whose lines carried no usable timestamp have no scatter plot data
+    response_timestamps = {k: np.array(v) for k, v in response_timestamps.items()}
+    response_timestamps = {k: v for k, v in response_timestamps.items() if not np.isnan(v).all()}
+    return response_times, error_stats, response_timestamps, error_timestamps, start_time
+
+
+def _response_time_statistics(times: np.ndarray) -> Dict[str, float]:
+    """Average/median/min/max/count of one request type's response times, via NumPy reductions."""
+    arr = np.asarray(times)
+    return {
+        'Average Response Time (ms)': arr.mean(dtype=np.float64),
+        'Median Response Time (ms)': float(np.median(arr)),  # partition, no full sort
+        'Min Response Time (ms)': float(arr.min()),
+        'Max Response Time (ms)': float(arr.max()),
+        'Count': arr.size
+    }
 
 
 def calculate_multi_file_statistics(file_data_list: List[FileData]) -> pd.DataFrame:
@@ -450,24 +557,11 @@ def calculate_multi_file_statistics(file_data_list: List[FileData]) -> pd.DataFr
     
     for file_data in file_data_list:
         for request_type, times in file_data.response_times.items():
-            if times:  # Only process if there are response times
-                sorted_times = sorted(times)
-                n = len(sorted_times)
-                
-                # Calculate median
-                if n % 2 == 0:
-                    median_time = (sorted_times[n//2 - 1] + sorted_times[n//2]) / 2
-                else:
-                    median_time = sorted_times[n//2]
-                
+            if len(times):  # Only process if there are response times
                 all_stats.append({
                     'Request Type': request_type,
                     'File': file_data.file_label,
-                    'Average Response Time (ms)': sum(times) / len(times),
-                    'Median Response Time (ms)': median_time,
-                    'Min Response Time (ms)': min(times),
-                    'Max Response Time (ms)': max(times),
-                    'Count': len(times)
+                    **_response_time_statistics(times)
                 })
     
     return pd.DataFrame(all_stats).sort_values(['Request Type', 'File'])
@@ -478,7 +572,8 @@ def create_multi_file_bar_chart(file_data_list: List[FileData], output_dir: Path
                                 simple_title: bool = False,
                                 publication_ready: bool = False,
                                 export_svg: bool = False,
-                                metric_type: str = "average"):
+                                metric_type: str = "average",
+                                use_latex: bool = False):
     """Create and save bar charts for multiple files using textures to distinguish files."""
     
     # Check if there are any errors across all files
@@ -497,8 +592,8 @@ def create_multi_file_bar_chart(file_data_list: List[FileData], output_dir: Path
             'font.family': 'serif',
             'font.serif': ['Times', 'Times New Roman', 'DejaVu Serif'],
             'mathtext.fontset': 'dejavuserif',
-            # LaTeX text rendering for crisp output
-            'text.usetex': True,
+            # LaTeX text rendering for crisp output; opt-in because it runs latex for every label
+            'text.usetex': use_latex,
             'text.latex.preamble': r'\usepackage{times}',
             'pdf.fonttype': 42,     # TrueType fonts (not bitmap)
             'ps.fonttype': 42,      # TrueType fonts (not bitmap)
@@ -545,6 +640,8 @@ def create_multi_file_bar_chart(file_data_list: List[FileData], output_dir: Path
         if len(file_data_list) > 8:
             # Use colormap for many categories
             colors = plt.colormaps['tab10'](np.linspace(0, 1, len(file_data_list)))
+        
+        use_median = metric_type.lower() == 'median'
 
         for i, file_data in enumerate(file_data_list):
             file_response_times = []
@@ -554,20 +651,15 @@ def create_multi_file_bar_chart(file_data_list: List[FileData], output_dir: Path
             color_to_use = colors[i]
             
             for request_type in all_request_types:
-                if request_type in file_data.response_times and file_data.response_times[request_type]:
-                    times = file_data.response_times[request_type]
-                    count = len(times)
+                if request_type in file_data.response_times and len(file_data.response_times[request_type]):
+                    times = np.asarray(file_data.response_times[request_type])
+                    count = times.size
                     
                     # Calculate the selected metric
-                    if metric_type.lower() == 'median':
-                        sorted_times = sorted(times)
-                        n = len(sorted_times)
-                        if n % 2 == 0:
-                            response_time_value = (sorted_times[n//2 - 1] + sorted_times[n//2]) / 2
-                        else:
-                            response_time_value = sorted_times[n//2]
+                    if use_median:
+                        response_time_value = float(np.median(times))
                     else:  # average
-                        response_time_value = sum(times) / len(times)
+                        response_time_value = times.mean(dtype=np.float64)
                 else:
                     response_time_value = 0
                     count = 0
@@ -589,8 +681,10 @@ def create_multi_file_bar_chart(file_data_list: List[FileData], output_dir: Path
                           edgecolor='black', linewidth=edge_width)
            
             # Add value labels on bars (omit response time labels in publication mode for cleaner appearance)
-            for j, (bar, response_time, count) in enumerate(zip(bars, file_response_times, file_request_counts)):
-                if response_time > 0:  # Only label non-zero bars
+            if not (publication_ready and omit_request_count_per_bar_labels):
+                # Only label non-zero bars
+                for j in np.flatnonzero(np.asarray(file_response_times) > 0):
+                    bar, response_time, count = bars[j], file_response_times[j], file_request_counts[j]
                     height = bar.get_height()
                     
                     # Only show response time labels if not in publication mode
@@ -686,8 +780,9 @@ def create_multi_file_bar_chart(file_data_list: List[FileData], output_dir: Path
                               hatch=hatch, edgecolor='black', linewidth=edge_width)
                 
                 # Add value labels on bars (only for non-zero values, omit in publication mode)
-                for j, (bar, count) in enumerate(zip(bars, file_error_counts)):
-                    if count > 0 and not publication_ready:  # Only label non-zero bars and not in publication mode
+                if not publication_ready:
+                    for j in np.flatnonzero(np.asarray(file_error_counts) > 0):
+                        bar, count = bars[j], file_error_counts[j]
                         height = bar.get_height()
                         ax2.text(bar.get_x() + bar.get_width()/2., height + height*0.01,
                                 f'{count}', ha='center', va='bottom', fontsize=8, fontweight='bold')
@@ -789,7 +884,8 @@ def _get_subplot_position_info(subplot_index: int, rows: int, cols: int) -> dict
 
 def create_box_plot(file_data_list: List[FileData], output_dir: Path,
                     publication_ready: bool = False,
-                    export_svg: bool = False):
+                    export_svg: bool = False,
+                    use_latex: bool = False):
     """Create and save box plots showing response time distributions for each group/file.
     
     Each box corresponds to one group or consolidated log file, showing the distribution
@@ -800,6 +896,7 @@ def create_box_plot(file_data_list: List[FileData], output_dir: Path,
         output_dir: Directory to save the output
         publication_ready: Whether to use publication-ready styling
         export_svg: Whether to also export SVG format
+        use_latex: Whether to render text with LaTeX in publication mode
     """
     
     # Set publication-ready styling
@@ -814,7 +911,7 @@ def create_box_plot(file_data_list: List[FileData], output_dir: Path,
             'font.family': 'serif',
             'font.serif': ['Times', 'Times New Roman', 'DejaVu Serif'],
             'mathtext.fontset': 'dejavuserif',
-            'text.usetex': True,
+            'text.usetex': use_latex,
             'text.latex.preamble': r'\usepackage{times}',
             'pdf.fonttype': 42,
             'ps.fonttype': 42,
@@ -834,9 +931,7 @@ def create_box_plot(file_data_list: List[FileData], output_dir: Path,
     
     for file_data in file_data_list:
         # Combine all response times from all request types for this file/group
-        all_times = []
-        for request_type, times in file_data.response_times.items():
-            all_times.extend(times)
+        all_times = np.concatenate(list(file_data.response_times.values())) if file_data.response_times else []
         
         # Extract number from label (e.g., "Group 500" -> "500")
         label = file_data.file_label
@@ -848,7 +943,7 @@ def create_box_plot(file_data_list: List[FileData], output_dir: Path,
             except (IndexError, ValueError):
                 pass  # Keep original label if parsing fails
         
-        if all_times:
+        if len(all_times):
             box_data.append(all_times)
             labels.append(label)
             counts.append(len(all_times))
@@ -949,7 +1044,8 @@ def create_box_plot(file_data_list: List[FileData], output_dir: Path,
 
 def create_scatter_plot(file_data_list: List[FileData], output_dir: Path,
                         publication_ready: bool = False,
-                        export_svg: bool = False):
+                        export_svg: bool = False,
+                        use_latex: bool = False):
     """Create and save scatter/line plots for response times over relative time.
     
     Optimizes subplot axes by hiding:
@@ -969,12 +1065,13 @@ def create_scatter_plot(file_data_list: List[FileData], output_dir: Path,
             'font.family': 'serif',
             'font.serif': ['Times', 'Times New Roman', 'DejaVu Serif'],
             'mathtext.fontset': 'dejavuserif',
-            'text.usetex': True,
+            'text.usetex': use_latex,
             'text.latex.preamble': r'\usepackage{times}',
             'pdf.fonttype': 42,
             'ps.fonttype': 42,
             'svg.fonttype': 'none',
             'axes.unicode_minus': False,
+            'pdf.compression': 9,  # Maximum zlib level; the point clouds dominate the file size
         })
     
     # Calculate subplot layout based on number of files
@@ -995,7 +1092,9 @@ def create_scatter_plot(file_data_list: List[FileData], output_dir: Path,
         rows, cols = 3, 3
         figsize = (15, 10) if publication_ready else (18, 15)
     
-    fig, axes = plt.subplots(rows, cols, figsize=figsize)
+    # A single subplot is laid out by constrained layout while drawing; the multi-file grid
+    # gets fixed margins below
+    fig, axes = plt.subplots(rows, cols, figsize=figsize, constrained_layout=(num_files == 1))
     
     # Handle single subplot case
     if num_files == 1:
@@ -1009,14 +1108,17 @@ def create_scatter_plot(file_data_list: List[FileData], output_dir: Path,
     
     # Colors for different request types within each subplot
     request_colors = ['#1f77b4', '#ff7f0e', '#2ca02c', '#9467bd', '#8c564b', '#e377c2']
+    # Assigned once in first-seen order, so a request type keeps its color in every subplot
+    plotted_types = dict.fromkeys(request_type for file_data in file_data_list
+                                  for request_type, times in file_data.response_times.items()
+                                  if request_type != "ERROR" and len(times) > 0
+                                  and request_type in file_data.response_timestamps)
+    color_map = {request_type: request_colors[index % len(request_colors)]
+                 for index, request_type in enumerate(plotted_types)}
     
     # Find global y-axis range for consistent scaling
-    global_max_time = 0
-    for file_data in file_data_list:
-        if file_data.response_times:
-            for times in file_data.response_times.values():
-                if times:
-                    global_max_time = max(global_max_time, max(times))
+    global_max_time = max((float(times.max()) for file_data in file_data_list
+                           for times in file_data.response_times.values() if len(times)), default=0)
     
     # Plot each file in its own subplot
     for i, file_data in enumerate(file_data_list):
@@ -1044,32 +1146,37 @@ def create_scatter_plot(file_data_list: List[FileData], output_dir: Path,
             
             continue
         
-        # Plot each request type with different colors
-        request_type_index = 0
+        # Plot each request type with its color
         legend_elements = []
         
+        # Large point clouds are embedded as bitmaps in publication output, which keeps the PDF
+        # small and quick to display; axes, labels and legends stay vector. A 600 dpi subplot
+        # bitmap costs a few MB, so below the threshold vector markers are smaller.
+        num_points = sum(len(t) for t in file_data.response_timestamps.values()) + len(file_data.error_timestamps)
+        rasterize_points = publication_ready and num_points >= SCATTER_RASTERIZE_MIN_POINTS
+        
         for request_type, timestamps in file_data.response_timestamps.items():
             if request_type == "ERROR":
                 continue  # Handle errors separately
                 
             if request_type in file_data.response_times:
+                # Both arrays are index-aligned (see parse_log_file), so they go to scatter() as is
                 response_times = file_data.response_times[request_type]
-                min_len = min(len(timestamps), len(response_times))
                 
-                if min_len > 0:
-                    color = request_colors[request_type_index % len(request_colors)]
-                    scatter = ax.scatter(timestamps[:min_len], response_times[:min_len], 
-                                       alpha=0.7, s=15, color=color, marker='o')
+                if len(response_times) > 0:
+                    scatter = ax.scatter(timestamps, response_times, 
+                                       alpha=0.7, s=15, color=color_map[request_type], marker='o',
+                                       rasterized=rasterize_points)
                     legend_elements.append((scatter, request_type))
-                    request_type_index += 1
         
         # Plot errors as red X markers
         if file_data.error_timestamps:
             # Use a high value for error visualization
-            error_response_times = [global_max_time * 1.1] * len(file_data.error_timestamps)
+            error_response_times = np.full(len(file_data.error_timestamps), global_max_time * 1.1)
             # error_response_times = [0] * len(file_data.error_timestamps)
             error_scatter = ax.scatter(file_data.error_timestamps, error_response_times, 
-                                     color='red', marker='x', s=30, alpha=0.8)
+                                     color='red', marker='x', s=30, alpha=0.8,
+                                     rasterized=rasterize_points)
             legend_elements.append((error_scatter, 'Errors'))
         
         # Formatting for each subplot with optimized axis labels
@@ -1111,13 +1218,9 @@ def create_scatter_plot(file_data_list: List[FileData], output_dir: Path,
     
     # Adjust layout with minimal padding between subplots
     if num_files > 1:
-        # Use subplots_adjust for more precise control over spacing
-        plt.subplots_adjust(hspace=0.0, wspace=0.0)  # Zero vertical and horizontal spacing
-        # Apply tight_layout first, then override with subplots_adjust for final control
-        plt.tight_layout(rect=[0, 0.03, 1, 0.95], pad=0.1)
-        plt.subplots_adjust(hspace=0.0, wspace=0.0)  # Reapply to ensure zero spacing
-    else:
-        plt.tight_layout(pad=0.1)  # Minimal padding for single subplot
+        # Fixed margins with zero spacing between subplots; tight_layout's spacing would be
+        # overridden anyway, and bbox_inches='tight' on save trims the outer margins
+        fig.subplots_adjust(left=0.06, right=0.98, top=0.95, bottom=0.08, hspace=0.0, wspace=0.0)
     
     # Generate output filename
     if len(file_data_list) == 1:
@@ -1148,28 +1251,15 @@ def create_scatter_plot(file_data_list: List[FileData], output_dir: Path,
     plt.close()
 
 
-def _calculate_file_statistics(response_times: Dict[str, List[float]]) -> pd.DataFrame:
+def _calculate_file_statistics(response_times: Dict[str, np.ndarray]) -> pd.DataFrame:
     """Calculate average and median response times for each request type (helper function)."""
     stats = []
     
     for request_type, times in response_times.items():
-        if times:  # Only process if there are response times
-            sorted_times = sorted(times)
-            n = len(sorted_times)
-            
-            # Calculate median
-            if n % 2 == 0:
-                median_time = (sorted_times[n//2 - 1] + sorted_times[n//2]) / 2
-            else:
-                median_time = sorted_times[n//2]
-            
+        if len(times):  # Only process if there are response times
             stats.append({
                 'Request Type': request_type,
-                'Average Response Time (ms)': sum(times) / len(times),
-                'Median Response Time (ms)': median_time,
-                'Min Response Time (ms)': min(times),
-                'Max Response Time (ms)': max(times),
-                'Count': len(times)
+                **_response_time_statistics(times)
             })
     
     if not stats:
@@ -1238,9 +1328,8 @@ def print_multi_file_summary(file_data_list: List[FileData], metric_type: str =
     combined_request_types = set()
     
     for file_data in file_data_list:
-        stats_df = _calculate_file_statistics(file_data.response_times)
-        if not stats_df.empty:
-            total_requests_all += stats_df['Count'].sum()
+        # Only the counts are needed here, not the full per-type statistics
+        total_requests_all += sum(len(times) for times in file_data.response_times.values())
         total_errors_all += file_data.error_stats.total_errors
         combined_request_types.update(file_data.response_times.keys())
     
@@ -1268,7 +1357,8 @@ def analyze(
     export_svg: bool = typer.Option(False, "--svg", help="Also export SVG format for better LaTeX compatibility"),
     metric_type: str = typer.Option("average", "--metric-type", "-m", help="Response time metric to plot ('average' or 'median')", case_sensitive=False),
     scatter_plot: bool = typer.Option(False, "--scatter-plot", help="Generate scatter/line plot of response times over time instead of bar charts"),
-    box_plot: bool = typer.Option(False, "--box-plot", help="Generate box plot showing response time distributions for each group")
+    box_plot: bool = typer.Option(False, "--box-plot", help="Generate box plot showing response time distributions for each group"),
+    use_latex: bool = typer.Option(False, "--latex", help="Render text with LaTeX in publication mode (needs a LaTeX installation, much slower)")
 ):
     """
     Analyze worker log files from a directory and create visualizations showing:
@@ -1352,18 +1442,19 @@ def analyze(
             typer.echo("\nCreating box plot...")
             create_box_plot(file_data_list, output_dir, 
                           publication_ready=publication_ready, 
-                          export_svg=export_svg)
+                          export_svg=export_svg, use_latex=use_latex)
         elif scatter_plot:
             typer.echo("\nCreating scatter plot...")
             create_scatter_plot(file_data_list, output_dir, 
                               publication_ready=publication_ready, 
-                              export_svg=export_svg)
+                              export_svg=export_svg, use_latex=use_latex)
         else:
             typer.echo("\nCreating bar charts...")
             # Use consistent styling for all cases (simplified for better readability)
             create_multi_file_bar_chart(file_data_list, output_dir, omit_request_count_per_bar_labels=True, 
                                        simple_title=True, publication_ready=publication_ready, 
-                                       export_svg=export_svg, metric_type=metric_type_lower)
+                                       export_svg=export_svg, metric_type=metric_type_lower,
+                                       use_latex=use_latex)
         
         # Print summary using multi-file summary function
         print_multi_file_summary(file_data_list, metric_type_lower)
@@ -568,7 +568,7 @@ cleanup() {
         mv -v hivemq-logs/* "$root_folder/Automations/$target_folder_for_logs/Broker_Logs"
 
         # determine arrival and service rates for this experiment
-        python "$root_folder/Automations/analyze_broker_logs.py" < "$root_folder/Automations/$target_folder_for_logs/Broker_Logs/hivemq.log" > "$root_folder/Automations/$target_folder_for_logs/Broker_Logs/hivemq_analysis.log"
+        python "$root_folder/Automations/analyze_broker_logs.py" "$root_folder/Automations/$target_folder_for_logs/Broker_Logs/hivemq.log" > "$root_folder/Automations/$target_folder_for_logs/Broker_Logs/hivemq_analysis.log"
       fi
 
       for file in ${fault_injector_logfile_base_name}*.log; do
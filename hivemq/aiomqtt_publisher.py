@@ -7,6 +7,7 @@ import aiomqtt
 import sys
 import asyncio
 import logging
+import os
 
 # Get configuration from command line
 if len(sys.argv) < 4:
@@ -19,9 +20,9 @@ MESSAGE = sys.argv[3]
 QOS = int(sys.argv[4]) if len(sys.argv) > 4 else 2  # Default to QoS 2 (matching proxy1)
 MQTT_PORT = 1883
 
-# Enable debug logging
+# Log level from LOG_LEVEL (default WARNING); DEBUG logs every MQTT packet
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.getenv('LOG_LEVEL', 'WARNING').upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
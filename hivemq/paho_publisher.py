@@ -8,6 +8,7 @@ from paho.mqtt.enums import MQTTProtocolVersion
 import sys
 import time
 import logging
+import os
 
 # Get configuration from command line
 if len(sys.argv) != 5:
@@ -20,9 +21,9 @@ MESSAGE = sys.argv[3]
 QOS = int(sys.argv[4])
 MQTT_PORT = 1883
 
-# Enable debug logging
+# Log level from LOG_LEVEL (default WARNING); DEBUG logs every MQTT packet
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.getenv('LOG_LEVEL', 'WARNING').upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
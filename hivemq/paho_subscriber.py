@@ -7,6 +7,7 @@ import paho.mqtt.client as mqtt
 from paho.mqtt.enums import MQTTProtocolVersion
 from paho.mqtt.packettypes import PacketTypes
 import sys
+import os
 import logging
 
 # Get configuration from command line
@@ -20,9 +21,9 @@ SHARED_TOPIC = sys.argv[3]
 SUBSCRIBE_QOS = int(sys.argv[4]) if len(sys.argv) > 4 else 1  # Default to QoS 1
 MQTT_PORT = 1883
 
-# Enable debug logging to see CONNECT/SUBSCRIBE packets
+# Log level from LOG_LEVEL (default WARNING); DEBUG shows CONNECT/SUBSCRIBE and every PUBLISH packet
 logging.basicConfig(
-    level=logging.DEBUG,
+    level=os.getenv('LOG_LEVEL', 'WARNING').upper(),
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
 )
 
@@ -37,17 +38,22 @@ def on_connect(client, userdata, flags, rc, properties=None):
     else:
         print(f"[{CLIENT_ID}] Connection failed with code {rc}")
         sys.exit(1)
+    sys.stdout.flush()
 
 
 def on_subscribe(client, userdata, mid, reason_codes, properties=None):
     """Subscribe callback"""
     print(f"[{CLIENT_ID}] SUBACK received, mid={mid}, reason_codes={reason_codes}")
+    sys.stdout.flush()
+
+
+RECEIVED_PREFIX = f"[{CLIENT_ID}] RECEIVED: ".encode()
 
 
 def on_message(client, userdata, msg):
     """Message received callback"""
-    print(f"[{CLIENT_ID}] RECEIVED: {msg.topic} {msg.payload.decode()}")
-    sys.stdout.flush()
+    # One unbuffered write per message, straight from the payload bytes
+    os.write(1, RECEIVED_PREFIX + msg.topic.encode() + b' ' + msg.payload + b'\n')
 
 
 # Create MQTTv5 client with clean_start=False (matching mosquitto_sub -c)
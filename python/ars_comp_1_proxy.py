@@ -1,30 +1,42 @@
-from fastapi.encoders import jsonable_encoder
-from fastapi import FastAPI, Body, Depends, Query, HTTPException, Header
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import JSONResponse, Response
 from fastapi.requests import Request
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from datetime import datetime
 import time
-from typing import Annotated, Optional, Tuple
+from typing import Optional, Tuple
 from contextlib import asynccontextmanager
 import os
 import json
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+import queue
+import atexit
 import httpx
 from httpx import AsyncClient, HTTPStatusError, RequestError
 import uvicorn
 import socket
 from urllib.parse import urlparse
 import asyncio
-from threading import Lock
+from contextvars import ContextVar
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 # Configure logging
-if not os.path.exists('logs'):
-    os.makedirs('logs')
+os.makedirs('logs', exist_ok=True)
+
+# Records never use thread/process fields, so skip collecting them per call
+logging.logThreads = False
+logging.logProcesses = False
+logging.logMultiprocessing = False
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
+logger.setLevel(os.getenv('LOG_LEVEL', 'DEBUG').upper())
 
 uvicorn_logger = logging.getLogger("uvicorn")
 uvicorn_logger.setLevel(logging.DEBUG)
@@ -35,11 +47,29 @@ handler = RotatingFileHandler(
     maxBytes=100*1024*1024,  # 100MB
     backupCount=5
 )
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s')
 handler.setFormatter(formatter)
 
-logger.addHandler(handler)
-uvicorn_logger.addHandler(handler)
+# Request-Id of the request being handled; the filter stamps it on every record, so
+# log calls don't interpolate it themselves
+current_request_id: ContextVar[Optional[str]] = ContextVar('current_request_id', default='-')
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record):
+        record.request_id = current_request_id.get()
+        return True
+
+# Request handlers only enqueue records; a background thread formats them and
+# writes the rotating file, so file I/O never blocks the event loop
+log_queue = queue.Queue(-1)
+queue_handler = QueueHandler(log_queue)
+queue_handler.addFilter(RequestIdFilter())
+log_listener = QueueListener(log_queue, handler)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+logger.addHandler(queue_handler)
+uvicorn_logger.addHandler(queue_handler)
 
 TARGET_URL = os.getenv('TARGET_URL', 'http://localhost:8080/ID_REQ_KC_STORE7D3BPACKET')
 
@@ -56,33 +86,49 @@ def resolve_hostname_to_ip(url: str) -> str:
         return url
     
     if hostname in dns_cache:
-        logger.debug(f"DNS cache hit for {hostname} -> {dns_cache[hostname]}")
-        return url.replace(hostname, dns_cache[hostname])
-    
-    try:
-        # Resolve hostname to IP
-        ip_address = socket.gethostbyname(hostname)
+        ip_address = dns_cache[hostname]
+        logger.debug("DNS cache hit for %s -> %s", hostname, ip_address)
+    else:
+        try:
+            # Resolve hostname to IP; unlike gethostbyname, getaddrinfo also returns IPv6 addresses
+            ip_address = socket.getaddrinfo(hostname, parsed.port, type=socket.SOCK_STREAM)[0][4][0]
+        except socket.gaierror as e:
+            logger.warning("DNS resolution failed for %s: %s. Using original URL.", hostname, e)
+            return url
         dns_cache[hostname] = ip_address
-        logger.info(f"DNS resolved {hostname} -> {ip_address}")
-        return url.replace(hostname, ip_address)
-    except socket.gaierror as e:
-        logger.warning(f"DNS resolution failed for {hostname}: {e}. Using original URL.")
-        return url
+        logger.info("DNS resolved %s -> %s", hostname, ip_address)
+
+    # Swap only the host part of the netloc, so the hostname is left alone if it also appears in the path
+    userinfo, at, _ = parsed.netloc.rpartition('@')
+    host = f"[{ip_address}]" if ':' in ip_address else ip_address
+    port = f":{parsed.port}" if parsed.port is not None else ""
+    return parsed._replace(netloc=f"{userinfo}{at}{host}{port}").geturl()
 
 # Initialize async HTTP client
 httpclient:AsyncClient = None
-resolved_target_url = ""
+resolved_target_url: httpx.URL = None
 
 # Request rate tracking with sliding window
 from collections import deque
+# Only touched from the event loop thread, so it needs no lock; deque.append with
+# maxlen already behaves as a ring buffer
 request_timestamps = deque(maxlen=1000)  # Keep last 1000 request timestamps
-request_lock = Lock()
+
+# Opt-in fire-and-forget mode: the endpoint queues the message and answers right away,
+# background workers forward it to TARGET_URL and retry with backoff on failure
+FIRE_AND_FORGET = os.getenv('FIRE_AND_FORGET', '').lower() in ('1', 'true', 'yes')
+OUTBOX_WORKERS = int(os.getenv('OUTBOX_WORKERS', '4'))
+OUTBOX_RETRIES = int(os.getenv('OUTBOX_RETRIES', '3'))
+# Upper bound in seconds on delivering what is still queued at shutdown
+OUTBOX_DRAIN_TIMEOUT = float(os.getenv('OUTBOX_DRAIN_TIMEOUT', '10'))
+outbox: asyncio.Queue = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global httpclient, resolved_target_url
+    global httpclient, resolved_target_url, outbox
     # Startup: Resolve DNS and create a single persistent HTTP client
-    resolved_target_url = resolve_hostname_to_ip(TARGET_URL)
+    # Parsed once here; httpx reuses an httpx.URL as is instead of re-parsing the string per request
+    resolved_target_url = httpx.URL(resolve_hostname_to_ip(TARGET_URL))
     
     # Use resolved URL only when running with uvicorn (HTTP/1.1), original URL otherwise (HTTP/2 with granian)
     use_http2 = os.getenv('USE_HTTP_2', '').lower() in ('1', 'true', 'yes')
@@ -91,6 +137,8 @@ async def lifespan(app: FastAPI):
         http2=use_http2, # use http2 here because ARS_Comp_2 and LP1 use HTTP2.
         http1=not use_http2, # set to false to force http2 over plain text. Disabling http1 here, deactivates HTTP 1.1 Upgrade to HTTP 2.0
         timeout=httpx.Timeout(60.0),  # 60 second timeout
+        # Every body is pre-encoded JSON; as a client default this header isn't rebuilt per request
+        headers={"Content-Type": "application/json"},
         limits=httpx.Limits(
             max_keepalive_connections=100,
             max_connections=None, # No limit
@@ -98,8 +146,31 @@ async def lifespan(app: FastAPI):
         )
     )
     logger.info(f"HTTP client initialized with resolved URL: {resolved_target_url}")
+
+    # Open pooled connections before the first real request so it doesn't pay the TCP
+    # (and HTTP/2) setup; the target only answers POST, but a 405 still leaves the
+    # connection in the pool. Failures are ignored, the target may not be up yet.
+    prewarm = int(os.getenv('PREWARM_CONNECTIONS', '16'))
+    if prewarm > 0:
+        results = await asyncio.gather(*(httpclient.head(resolved_target_url, timeout=2.0) for _ in range(prewarm)),
+                                       return_exceptions=True)
+        opened = sum(not isinstance(result, Exception) for result in results)
+        logger.info(f"Pre-warmed {opened}/{prewarm} connections to {resolved_target_url}")
+
+    workers = []
+    if FIRE_AND_FORGET:
+        outbox = asyncio.Queue(maxsize=10_000)
+        workers = [asyncio.create_task(drain_outbox()) for _ in range(OUTBOX_WORKERS)]
+        logger.info(f"Fire-and-forget mode with {OUTBOX_WORKERS} outbox workers")
     yield
-    # Shutdown: Close the HTTP client
+    # Shutdown: Deliver what is still queued, then close the HTTP client
+    if workers:
+        try:
+            await asyncio.wait_for(outbox.join(), OUTBOX_DRAIN_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Outbox not drained within %ss, %d messages still queued", OUTBOX_DRAIN_TIMEOUT, outbox.qsize())
+        for worker in workers:
+            worker.cancel()
     if httpclient:
         await httpclient.aclose()
         logger.info("HTTP client closed")
@@ -131,14 +202,13 @@ def calculate_rps(window_seconds=5):
     current_time = time.time()
     cutoff_time = current_time - window_seconds
     
-    with request_lock:
-        # Remove timestamps older than the window
-        while request_timestamps and request_timestamps[0] < cutoff_time:
-            request_timestamps.popleft()
-        
-        # Calculate RPS
-        request_count = len(request_timestamps)
-        return round(request_count / window_seconds, 1)
+    # Remove timestamps older than the window
+    while request_timestamps and request_timestamps[0] < cutoff_time:
+        request_timestamps.popleft()
+    
+    # Calculate RPS
+    request_count = len(request_timestamps)
+    return round(request_count / window_seconds, 1)
 
 
 class SimpleCall(BaseModel):
@@ -151,39 +221,77 @@ class SimpleCall(BaseModel):
         return f"Phone: {self.phone}, Branch: {self.branch}, Headnumber: {self.headnumber}, TriggerTime: {self.triggertime}"
 
 
-def get_simple_call_from_query(
-    Phone: Optional[str] = Query(None),
-    Branch: Optional[str] = Query(None),
-    Headnumber: Optional[str] = Query(None),
-    TriggerTime: Optional[datetime] = Query(None),
-) -> Optional[SimpleCall]:
-    if all([Phone, Branch, Headnumber, TriggerTime]):
-        return SimpleCall(
-            phone=Phone, branch=Branch, headnumber=Headnumber, triggertime=TriggerTime
-        )
+# SimpleCall field -> query parameter name
+QUERY_PARAMETER_NAMES = {'phone': 'Phone', 'branch': 'Branch', 'headnumber': 'Headnumber', 'triggertime': 'TriggerTime'}
+
+
+def get_simple_call_from_query(request: Request) -> Optional[SimpleCall]:
+    query = request.query_params
+    Phone = query.get('Phone')
+    Branch = query.get('Branch')
+    Headnumber = query.get('Headnumber')
+    TriggerTime = query.get('TriggerTime')
+    if Phone and Branch and Headnumber and TriggerTime:
+        try:
+            return SimpleCall(
+                phone=Phone, branch=Branch, headnumber=Headnumber, triggertime=TriggerTime
+            )
+        except ValidationError as e:
+            raise RequestValidationError(_error_locations(e, "query", QUERY_PARAMETER_NAMES))
     return None
 
 
+async def get_simple_call_from_body(request: Request) -> Optional[SimpleCall]:
+    raw_body = await request.body()
+    if not raw_body:
+        return None
+    try:
+        return SimpleCall.model_validate_json(raw_body)
+    except ValidationError as e:
+        raise RequestValidationError(_error_locations(e, "body"))
+
+
+def _error_locations(error: ValidationError, source: str, names: Optional[dict] = None) -> list:
+    """Validation errors located the way FastAPI reports them (e.g. ["body", "branch"])"""
+    names = names or {}
+    return [{**err, "loc": (source, *(names.get(part, part) for part in err["loc"]))}
+            for err in error.errors(include_url=False)]
+
+
+def dump_json(json_object) -> bytes:
+    """Serialize to the same compact UTF-8 JSON body httpx's json= would send"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(json_object)
+    return json.dumps(json_object, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+# The endpoint's fixed replies, serialized once instead of on every request
+SUCCESS_BODY = dump_json({
+    "status": "success",
+    "message": "Data published to Legacy System"
+})
+MISSING_INPUT_BODY = dump_json({"error": "Missing input: provide either query parameters or a JSON body."})
+
+
 async def on_message(json_object, request_id) -> Tuple[bool, str]:
     try:
         headers = {"Request-Id": f"{request_id}"}
 
-        response = await httpclient.post(resolved_target_url, headers=headers, json=json_object)
-        logger.debug(f"[{request_id}] Response: %s", response.status_code)
-        logger.debug(f"[{request_id}] HTTP version: %s", response.http_version)
+        response = await httpclient.post(resolved_target_url, headers=headers, content=dump_json(json_object))
+        logger.debug("Response: %s", response.status_code)
+        logger.debug("HTTP version: %s", response.http_version)
         response.raise_for_status()
         return True, ""
     except HTTPStatusError as e:
-        error_msg = f"[{request_id}] HTTP error {e.response.status_code}: {e.response.text}"
+        error_msg = f"HTTP error {e.response.status_code}: {e.response.text}"
         return False, error_msg
     except RequestError as e:
         # Check if it's a timeout error specifically
         if 'timeout' in str(e).lower() or 'timed out' in str(e).lower():
-            error_msg = f"[{request_id}] TIMEOUT sending to legacy proxy: {type(e).__name__}: {str(e) or repr(e)}"
+            error_msg = f"TIMEOUT sending to legacy proxy: {type(e).__name__}: {str(e) or repr(e)}"
         else:
-            error_msg = f"[{request_id}] Failed to send message to legacy proxy: {type(e).__name__}: {str(e) or repr(e)}"
+            error_msg = f"Failed to send message to legacy proxy: {type(e).__name__}: {str(e) or repr(e)}"
         return False, error_msg
-        error_msg = f"[{request_id}] Unexpected error while processing message: {type(e).__name__}: {str(e) or repr(e)}"
+        error_msg = f"Unexpected error while processing message: {type(e).__name__}: {str(e) or repr(e)}"
         return False, error_msg
 
 
@@ -205,40 +313,48 @@ async def on_message(json_object, request_id) -> Tuple[bool, str]:
 #     logger.info(f"{request.method} {request.url.path} -> {response.status_code} in {duration:.3f}s")
 #     return response
 
-@app.middleware("http")
-async def track_request_rate(request: Request, call_next):
+async def drain_outbox():
+    """Forward queued messages, retrying failed sends with exponential backoff"""
+    while True:
+        json_msg, request_id = await outbox.get()
+        token = current_request_id.set(request_id)
+        try:
+            for attempt in range(OUTBOX_RETRIES + 1):
+                success, error = await on_message(json_msg, request_id)
+                if success:
+                    logger.info("Successfully send message")
+                    break
+                logger.error("HTTP send failed (attempt %d): %s", attempt + 1, error)
+                if attempt < OUTBOX_RETRIES:
+                    await asyncio.sleep(0.1 * 2 ** attempt)
+        except Exception as e:
+            # on_message only turns HTTP errors into a result; anything else would end this worker
+            logger.exception("Unexpected error while forwarding message: %s: %s", type(e).__name__, e)
+        finally:
+            current_request_id.reset(token)
+            outbox.task_done()
+
+
+async def receive_simple_call(request: Request):
+    # Registered as a plain Starlette route (see below): query, body and header are read
+    # directly instead of through FastAPI's per-request dependency solver
+    query_data = get_simple_call_from_query(request)
+    body_data = await get_simple_call_from_body(request)
+    request_id = request.headers.get('request-id')
+    token = current_request_id.set(request_id)
+
+    # Request rate is tracked here rather than in an HTTP middleware, which would wrap
+    # every request in an extra coroutine and ASGI send/receive layer
     start_time = time.time()
-    request_id = request.headers.get('request-id', 'unknown')
-    start_formatted = datetime.fromtimestamp(start_time).strftime('%H:%M:%S.%f')[:-3]
-    logger.debug(f"[MIDDLEWARE_START][{request_id}] Request received at {start_formatted}")
-    
-    # Record request timestamp
-    with request_lock:
-        request_timestamps.append(start_time)
-    
-    response = await call_next(request)
-    
-    end_time = time.time()
-    duration = end_time - start_time
-    logger.debug(f"[MIDDLEWARE_END][{request_id}] Request completed in {duration:.3f}s")
-    
-    return response
-
-
-@app.post("/api/v1/simple")
-async def receive_simple_call(
-    query_data: Optional[SimpleCall] = Depends(get_simple_call_from_query),
-    body_data: Optional[SimpleCall] = Body(None),
-    request_id: Annotated[str | None, Header()] = None
-):
-    endpoint_start = time.time()
-    endpoint_formatted = datetime.fromtimestamp(endpoint_start).strftime('%H:%M:%S.%f')[:-3]
-    logger.debug(f"[ENDPOINT_START][{request_id}] Handler started at {endpoint_formatted}")
+    request_timestamps.append(start_time)
+    if logger.isEnabledFor(logging.DEBUG):
+        endpoint_formatted = datetime.fromtimestamp(start_time).strftime('%H:%M:%S.%f')[:-3]
+        logger.debug("[ENDPOINT_START] Handler started at %s", endpoint_formatted)
     
     try:
         data = query_data or body_data
         if not data:
-            return {"error": "Missing input: provide either query parameters or a JSON body."}
+            return Response(MISSING_INPUT_BODY, media_type="application/json")
 
         # message_str = json.dumps(jsonable_encoder(data))
         message_str = str(data)
@@ -249,42 +365,63 @@ async def receive_simple_call(
         }
 
         # Get current stats for enriched logging
-        current_rps = calculate_rps()
-        current_connections = get_connection_stats()
-        
-        logger.info(f"[rps:{current_rps}|conns:{current_connections}][{request_id}] Sending message {message_str} to {resolved_target_url} ...")
+        if logger.isEnabledFor(logging.INFO):
+            current_rps = calculate_rps()
+            current_connections = get_connection_stats()
+            logger.info("[rps:%s|conns:%s] Sending message %s to %s ...",
+                        current_rps, current_connections, message_str, resolved_target_url)
+
+        if outbox is not None:
+            try:
+                outbox.put_nowait((json_msg, request_id))
+                return Response(SUCCESS_BODY, media_type="application/json")
+            except asyncio.QueueFull:
+                pass  # Outbox is full: forward inline, which pushes back on the caller
 
         # Send to Legacy Proxy
         success, error = await on_message(json_msg, request_id)
         if not success:
-            logger.error(f"[{request_id}] HTTP send failed: {error}")
+            logger.error("HTTP send failed: %s", error)
             raise HTTPException(
                 status_code=500,
                 detail=f"Failed to send message: {error}"
             )
 
-        logger.info(f"[{request_id}] Successfully send message")
-        return {
-            "status": "success",
-            "message": "Data published to Legacy System"
-        }
+        logger.info("Successfully send message")
+        return Response(SUCCESS_BODY, media_type="application/json")
     except Exception as e:
-        logger.error(f"[{request_id}] Error processing request: {str(e)}")
+        logger.error("Error processing request: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error: {str(e)}"
         )
+    finally:
+        logger.debug("[ENDPOINT_END] Request completed in %.3fs", time.time() - start_time)
+        current_request_id.reset(token)
+
+app.add_route("/api/v1/simple", receive_simple_call, methods=["POST"])
 
 if __name__ == '__main__':
     port = int(os.getenv('HTTP_PORT', '8080'))
     host = os.getenv('HTTP_HOST', '0.0.0.0')
     
-    logger.info(f"Starting server on {host}:{port}")
+    # Worker processes share the listening socket; RPS tracking, the DNS cache and the
+    # outbox are per process. Multiple workers need the app as an import string.
+    workers = min(os.cpu_count() or 1, int(os.getenv('WORKERS', '1')))
+    
+    logger.info(f"Starting server on {host}:{port} with {workers} worker(s)")
     logger.info(f"Sending to: {TARGET_URL}")
     
-    uvicorn.run(app, 
+    uvicorn.run(app if workers == 1 else "ars_comp_1_proxy:app", 
+                workers=workers,
                 host=host, 
                 port=port, 
                 log_config=None, 
-                timeout_keep_alive=60)
+                # one access line per request on top of our own request logs
+                access_log=False,
+                timeout_keep_alive=60,
+                # uvicorn[standard] ships both; pin them so a broken install fails
+                # loudly instead of silently falling back to asyncio/h11
+                loop="uvloop",
+                http="httptools")
 
@@ -1,8 +1,13 @@
 
-from fastapi import FastAPI, HTTPException, Header
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException
+from fastapi.exceptions import RequestValidationError
+from fastapi.requests import Request
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from pydantic import BaseModel, ValidationError
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+import queue
+import atexit
 import os
 import json
 from typing import Dict, Any, Tuple, Optional
@@ -13,12 +18,17 @@ import uvicorn
 import socket
 from urllib.parse import urlparse
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # Configure logging
-if not os.path.exists('logs'):
-    os.makedirs('logs')
+os.makedirs('logs', exist_ok=True)
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
+logger.setLevel(os.getenv('LOG_LEVEL', 'DEBUG').upper())
 
 uvicorn_logger = logging.getLogger("uvicorn")
 uvicorn_logger.setLevel(logging.INFO)
@@ -32,8 +42,16 @@ handler = RotatingFileHandler(
 formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 handler.setFormatter(formatter)
 
-logger.addHandler(handler)
-uvicorn_logger.addHandler(handler)
+# Request handlers only enqueue records; a background thread formats them and
+# writes the rotating file, so file I/O never blocks the event loop
+log_queue = queue.Queue(-1)
+queue_handler = QueueHandler(log_queue)
+log_listener = QueueListener(log_queue, handler)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+logger.addHandler(queue_handler)
+uvicorn_logger.addHandler(queue_handler)
 
 # DNS cache for hostname to IP resolution
 dns_cache = {}
@@ -48,18 +66,23 @@ def resolve_hostname_to_ip(url: str) -> str:
         return url
     
     if hostname in dns_cache:
-        logger.debug(f"DNS cache hit for {hostname} -> {dns_cache[hostname]}")
-        return url.replace(hostname, dns_cache[hostname])
-    
-    try:
-        # Resolve hostname to IP
-        ip_address = socket.gethostbyname(hostname)
+        ip_address = dns_cache[hostname]
+        logger.debug("DNS cache hit for %s -> %s", hostname, ip_address)
+    else:
+        try:
+            # Resolve hostname to IP; unlike gethostbyname, getaddrinfo also returns IPv6 addresses
+            ip_address = socket.getaddrinfo(hostname, parsed.port, type=socket.SOCK_STREAM)[0][4][0]
+        except socket.gaierror as e:
+            logger.warning("DNS resolution failed for %s: %s. Using original URL.", hostname, e)
+            return url
         dns_cache[hostname] = ip_address
-        logger.info(f"DNS resolved {hostname} -> {ip_address}")
-        return url.replace(hostname, ip_address)
-    except socket.gaierror as e:
-        logger.warning(f"DNS resolution failed for {hostname}: {e}. Using original URL.")
-        return url
+        logger.info("DNS resolved %s -> %s", hostname, ip_address)
+
+    # Swap only the host part of the netloc, so the hostname is left alone if it also appears in the path
+    userinfo, at, _ = parsed.netloc.rpartition('@')
+    host = f"[{ip_address}]" if ':' in ip_address else ip_address
+    port = f":{parsed.port}" if parsed.port is not None else ""
+    return parsed._replace(netloc=f"{userinfo}{at}{host}{port}").geturl()
 
 # Initialize async HTTP client
 httpclient:AsyncClient = None
@@ -71,17 +94,24 @@ async def lifespan(app: FastAPI):
     # Startup: Resolve DNS and create a single persistent HTTP client
     resolved_target_url = resolve_hostname_to_ip(TARGET_URL)
     
+    # The RAST simulator only speaks HTTP 1.1. For an h2c-capable target, HTTP/2 lets all
+    # concurrent forwards share one connection as multiplexed streams. USE_HTTP_2 is not
+    # reused here because it switches this proxy's own server to HTTP/2.
+    target_http2 = os.getenv('TARGET_HTTP_2', '').lower() in ('1', 'true', 'yes')
+    
     httpclient = httpx.AsyncClient(
-        http2=False,
-        http1=True, # use http1.1 here because the RAST simulator uses HTTP 1.1
+        http2=target_http2,
+        http1=not target_http2, # set to false to force http2 over plain text. Disabling http1 here, deactivates HTTP 1.1 Upgrade to HTTP 2.0
         timeout=httpx.Timeout(60.0),  # 60 second timeout
+        # Every body is pre-encoded JSON; as a client default this header isn't rebuilt per request
+        headers={"Content-Type": "application/json"},
         limits=httpx.Limits(
             max_keepalive_connections=100,
             max_connections=None, # No limit
             keepalive_expiry=30.0
         )
     )
-    logger.info(f"HTTP client initialized with resolved URL: {resolved_target_url}")
+    logger.info(f"HTTP client initialized with resolved URL: {resolved_target_url}, HTTP/2: {target_http2}")
     yield
     # Shutdown: Close the HTTP client
     if httpclient:
@@ -92,22 +122,38 @@ async def lifespan(app: FastAPI):
 app = FastAPI(
     title="ARS Component 2 Proxy", 
     description="HTTP to target system service",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse if ORJSON_AVAILABLE else JSONResponse
 )
 
 TARGET_URL = os.getenv('TARGET_URL', 'http://localhost:8080/ID_REQ_KC_STORE7D3BPACKET')
+# Pass-through mode: forward request bodies exactly as received, without validating them or
+# adding request_id to them (the target then sees the request id in the Request-Id header only)
+FORWARD_RAW_BODY = os.getenv('FORWARD_RAW_BODY', '').lower() in ('1', 'true', 'yes')
 
 class Message(BaseModel):
     """Pydantic model for request validation"""
     id: str
     body: str
 
-async def on_message(json_object, request_id) -> Tuple[bool, str]:
+def dump_json(json_object) -> bytes:
+    """Serialize to the same compact UTF-8 JSON body httpx's json= would send"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(json_object)
+    return json.dumps(json_object, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+# The endpoint's fixed replies, serialized once instead of on every request
+SUCCESS_BODY = dump_json({
+    "status": "success",
+    "message": "Data published to Legacy System"
+})
+
+async def on_message(body: bytes, request_id) -> Tuple[bool, str]:
     try:
         headers = {"Request-Id": f"{request_id}"}
-        response = await httpclient.post(resolved_target_url, headers=headers, json=json_object)
-        logger.debug(f"[{request_id}] Response: %s", response.status_code)
-        logger.debug(f"[{request_id}] HTTP version: %s", response.http_version)
+        response = await httpclient.post(resolved_target_url, headers=headers, content=body)
+        logger.debug("[%s] Response: %s", request_id, response.status_code)
+        logger.debug("[%s] HTTP version: %s", request_id, response.http_version)
         response.raise_for_status()
         return True, ""
     except HTTPStatusError as e:
@@ -124,46 +170,77 @@ async def on_message(json_object, request_id) -> Tuple[bool, str]:
         return False, error_msg
 
 
-@app.post("/ID_REQ_KC_STORE7D3BPACKET")
-async def receive_message(message: Message, request_id: Optional[str] = Header(default=None)):
+async def get_message_from_body(request: Request) -> Message:
+    raw_body = await request.body()
+    if not raw_body:
+        raise RequestValidationError([{"type": "missing", "loc": ("body",), "msg": "Field required", "input": None}])
+    try:
+        # one pass from JSON bytes to the model in pydantic-core, without an
+        # intermediate dict from json.loads
+        return Message.model_validate_json(raw_body)
+    except ValidationError as e:
+        raise RequestValidationError([{**err, "loc": ("body", *err["loc"])}
+                                      for err in e.errors(include_url=False)])
+
+
+async def receive_message(request: Request):
     """Handle incoming POST requests with JSON data."""
+    # Registered as a plain Starlette route (see below): body and header are read
+    # directly instead of through FastAPI's per-request dependency solver
+    request_id = request.headers.get('request-id')
+    if FORWARD_RAW_BODY:
+        body = await request.body()
+        message_id = None
+    else:
+        message = await get_message_from_body(request)
+        message_id = message.id
     try:
-        # Convert message to JSON string
-        message_dict = {"id": message.id, "body": message.body}
-        if request_id is not None:
-            message_dict["request_id"] = request_id
-        message_str = json.dumps(message_dict)
+        if not FORWARD_RAW_BODY:
+            # Forwarded to the RAST simulator as a JSON object (it used to receive a quoted JSON string)
+            payload = {"id": message.id, "body": message.body}
+            if request_id is not None:
+                payload["request_id"] = request_id
+            body = dump_json(payload)
        
-        logger.info(f"[{request_id}] Forwarding message {message_str} to {resolved_target_url} ...")
+        logger.info("[%s] Forwarding message %s to %s ...", request_id, message_id, resolved_target_url)
         # Forward to Legacy System
-        success, error = await on_message(message_str, request_id)
+        success, error = await on_message(body, request_id)
         
         if not success:
-            logger.error(f"[{request_id}] HTTP forward failed: {error}")
+            logger.error("[%s] HTTP forward failed: %s", request_id, error)
             raise HTTPException(
                 status_code=500,
                 detail=f"Failed to forward message: {error}"
             )
 
-        logger.info(f"[{request_id}] Successfully forwarded message")
-        return {
-            "status": "success",
-            "message": "Data published to Legacy System"
-        }
+        logger.info("[%s] Successfully forwarded message", request_id)
+        return Response(SUCCESS_BODY, media_type="application/json")
 
     except Exception as e:
-        logger.error(f"[{request_id}] Error processing request: {str(e)}")
+        logger.error("[%s] Error processing request: %s", request_id, e)
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error: {str(e)}"
         )
 
+app.add_route("/ID_REQ_KC_STORE7D3BPACKET", receive_message, methods=["POST"])
+
 if __name__ == '__main__':
     port = int(os.getenv('HTTP_PORT', '8080'))
     host = os.getenv('HTTP_HOST', '0.0.0.0')
     
-    logger.info(f"Starting server on {host}:{port}")
+    # Worker processes share the listening socket; the DNS cache and the HTTP
+    # client pool are per process. Multiple workers need the app as an import string.
+    workers = min(os.cpu_count() or 1, int(os.getenv('WORKERS', '1')))
+    
+    logger.info(f"Starting server on {host}:{port} with {workers} worker(s)")
     logger.info(f"Forwarding to: {TARGET_URL}")
     
-    uvicorn.run(app, host=host, port=port, log_config=None, timeout_keep_alive=60)
+    uvicorn.run(app if workers == 1 else "ars_comp_2_proxy:app", workers=workers,
+                host=host, port=port, log_config=None, timeout_keep_alive=60,
+                # one access line per request on top of our own request logs
+                access_log=False,
+                # uvicorn[standard] ships both; pin them so a broken install fails
+                # loudly instead of silently falling back to asyncio/h11
+                loop="uvloop", http="httptools")
 
@@ -4,12 +4,13 @@ import typer
 import signal
 import sys
 import logging
+import re
+import asyncio
 
 from random import random, seed
 from time import sleep
-from apscheduler.schedulers.background import BackgroundScheduler
-from dataclasses import dataclass
-from datetime import datetime, timedelta
+from dataclasses import dataclass, field
+from datetime import datetime
 
 
 @dataclass
@@ -28,40 +29,78 @@ class StopOnceState:
     stop_service_after_sec: int
 
 
+@dataclass(slots=True)
+class FaultState:
+    is_faulted: bool = False
+    chosen_fault_time: float = 0
+    time_of_last_fault: datetime = field(default_factory=datetime.now)
+    time_of_recovery: datetime = field(default_factory=datetime.now)
+    stop_once: Optional[StopOnceState] = None
+
+
 def get_next_service_to_stop_once(stop_once_state: StopOnceState) -> int:
     if stop_once_state.currentServiceIndex + 1 < len(stop_once_state.services_to_stop):
         return stop_once_state.currentServiceIndex + 1
     return -1
 
 
-def between(min, max):
-    return min + random() * (max - min)
+async def _delayed(delay: float, action, *args):
+    await asyncio.sleep(delay)
+    try:
+        await action(*args)
+    except Exception:
+        logger.exception("[ERROR] Scheduled %s failed", action.__name__)
+
+
+async def _every(interval: float, action, *args):
+    loop = asyncio.get_running_loop()
+    next_run = loop.time() + interval
+    while True:
+        await asyncio.sleep(next_run - loop.time())
+        try:
+            await action(*args)
+        except Exception:
+            logger.exception("[ERROR] Scheduled %s failed", action.__name__)
+        # runs never overlap; ticks missed while one was running are skipped
+        while next_run <= loop.time():
+            next_run += interval
+
+
+def _spawn(coro):
+    task = asyncio.create_task(coro)
+    # the loop only keeps weak references to tasks
+    pending_tasks.add(task)
+    task.add_done_callback(pending_tasks.discard)
+    return task
+
 
+def schedule(delay: float, action, *args):
+    """Run the coroutine function `action` after `delay` seconds as a task of the running loop"""
+    return _spawn(_delayed(max(delay, 0), action, *args))
 
-def notify_operator(container, target_service: str):
+
+async def notify_operator(container, target_service: str):
     logger.debug("operator reaction time: %f", current_model.operator_reaction_time_s)
 
     # Simulate the time it takes until an operator reacts to the notification
     # we call this operator reaction time
-    due_date = datetime.now() + timedelta(0, current_model.operator_reaction_time_s)
-    scheduler.add_job(recover, 'date', run_date=due_date, args=[container, target_service])
+    schedule(current_model.operator_reaction_time_s, recover, container, target_service)
 
 
-def recover(container, target_service: str):
+async def recover(container, target_service: str):
     # Simulate the time an operator needs to perform a recovery action
     # we call this recovery action time
-    sleep(current_model.ars_recovery_time_s)
+    await asyncio.sleep(current_model.ars_recovery_time_s)
 
-    global _is_faulted
-    _is_faulted = False
+    state.is_faulted = False
 
-    start_container(container, target_service)
+    # the Docker API calls block, so they run in a worker thread
+    await asyncio.to_thread(start_container, container, target_service)
 
-    global time_of_recovery
-    time_of_recovery = datetime.now()
+    state.time_of_recovery = datetime.now()
 
-    logger.info("*%s* recovered @%s", target_service, time_of_recovery)
-    global stop_once_state
+    logger.info("*%s* recovered @%s", target_service, state.time_of_recovery)
+    stop_once_state = state.stop_once
     if stop_once_state is not None:
         next_service_index_to_stop = get_next_service_to_stop_once(stop_once_state)
         if next_service_index_to_stop != -1:
@@ -70,38 +109,32 @@ def recover(container, target_service: str):
 
 
 def is_faulted():
-    return _is_faulted
+    return state.is_faulted
 
 
 def inject_a_fault_every_s_seconds(container, target_service: str, s):
-    scheduler.add_job(simulate_fault, 'interval', seconds=s, args=[container, target_service])
+    _spawn(_every(s, simulate_fault, container, target_service))
 
 
 def inject_a_fault_once_after_s_seconds(stop_once_state: StopOnceState):
     container = stop_once_state.containers_to_stop[stop_once_state.currentServiceIndex]
     target_service = stop_once_state.services_to_stop[stop_once_state.currentServiceIndex]
 
-    run_date_for_next_job = datetime.now() + timedelta(seconds=stop_once_state.stop_service_after_sec)
-    scheduler.add_job(
-            simulate_fault, 
-            'date',
-            run_date=run_date_for_next_job,
-            args=[container, target_service]
-    )
+    schedule(stop_once_state.stop_service_after_sec, simulate_fault, container, target_service)
 
 
-def inject_three_faults_in_a_row(container, target_service):
-    due_date1 = datetime.now() + timedelta(0, minutes=5)
-    due_date2 = due_date1 + timedelta(0, 60)
-    due_date3 = due_date2 + timedelta(0, 60)
+async def inject_three_faults_in_a_row(container, target_service):
+    delay1 = 5 * 60
+    delay2 = delay1 + 60
+    delay3 = delay2 + 60
 
-    scheduler.add_job(simulate_fault, 'date', run_date=due_date1, args=[container, target_service])
-    scheduler.add_job(simulate_fault, 'date', run_date=due_date2, args=[container, target_service])
-    scheduler.add_job(simulate_fault, 'date', run_date=due_date3, args=[container, target_service])
-    scheduler.add_job(inject_three_faults_in_a_row, 'date', run_date=due_date3, args=[container, target_service])
+    schedule(delay1, simulate_fault, container, target_service)
+    schedule(delay2, simulate_fault, container, target_service)
+    schedule(delay3, simulate_fault, container, target_service)
+    schedule(delay3, inject_three_faults_in_a_row, container, target_service)
 
 
-def simulate_fault(container, target_service):
+async def simulate_fault(container, target_service):
     """
     simulate a fault:
     *
@@ -113,37 +146,32 @@ def simulate_fault(container, target_service):
         logger.debug("Still faulty")
         return
 
-    global chosen_fault_time
-
     # fault detection time:
     # indicates how long the fault detection mechanism requires to detect a fault
-    chosen_fault_time = between(current_model.fault_detection_time_range_s[0],
-                                current_model.fault_detection_time_range_s[1])
+    chosen_fault_time = _FD_LO + random() * (_FD_HI - _FD_LO)
 
     logger.debug("chosen_fault_time: %f", chosen_fault_time)
 
     # + delay until check
     # the fault detection mechanism needs more time depending on the
     # position of the ARS in the "checklist".
-    chosen_fault_time += 2 * (current_model.this_ARS_number_in_the_server_list - 1)
+    chosen_fault_time += _ARS_OFFSET
+    state.chosen_fault_time = chosen_fault_time
 
     logger.debug("# + delay until check: %f", chosen_fault_time)
 
-    stop_container(container, target_service)
+    await asyncio.to_thread(stop_container, container, target_service)
 
-    global time_of_last_fault
-    time_of_last_fault = datetime.now()
+    state.time_of_last_fault = datetime.now()
 
     logger.info("*%s* faulted @%s; operator will be notified in %ss",
                 target_service,
-                time_of_last_fault,
+                state.time_of_last_fault,
                 chosen_fault_time)
 
-    global _is_faulted
-    _is_faulted = True
+    state.is_faulted = True
 
-    due_date = datetime.now() + timedelta(0, chosen_fault_time)
-    scheduler.add_job(notify_operator, 'date', run_date=due_date, args=[container, target_service])
+    schedule(chosen_fault_time, notify_operator, container, target_service)
 
 # -- Fault Management Model --
 # (26, 34) are the minimum and maximum times,
@@ -159,13 +187,14 @@ model_production_ideal = FaultAndRecoveryModel(1, 0.5, (26, 34), 2)
 
 current_model = model_production_ideal
 
-scheduler = BackgroundScheduler(misfire_grace_time=None)
-time_of_last_fault = datetime.now()
-time_of_recovery = datetime.now()
-chosen_fault_time: float = 0
-_is_faulted = False
+# The model is fixed for the run, so its fault detection bounds and the
+# per-position check delay are only looked up once
+_FD_LO, _FD_HI = current_model.fault_detection_time_range_s
+_ARS_OFFSET = 2 * (current_model.this_ARS_number_in_the_server_list - 1)
 
-stop_once_state: Optional[StopOnceState] = None
+# Scheduled fault/notify/recover steps; at most a few are pending at any time
+pending_tasks = set()
+state = FaultState()
 
 # Configure logging
 logging.basicConfig(
@@ -185,41 +214,101 @@ signal.signal(signal.SIGTERM, handle_sigterm)
 signal.signal(signal.SIGINT, handle_sigterm)
 
 app = typer.Typer()
-client = docker.from_env()
+# Low-level client: containers are plain dicts from the list endpoint, whereas the
+# high-level SDK inspects every listed container to build its Container models
+api = docker.APIClient(**docker.utils.kwargs_from_env())
+
+# Containers resolved so far, by target service name. Listing containers is a slow
+# Docker API call, so a target is only looked up again once its container is gone.
+container_cache = {}
+
+def resolve_containers(target_services: List[str]) -> List:
+    """Containers for the given targets (None if not found); uncached ones are looked up in a single Docker API call"""
+    missing = [t for t in target_services if t not in container_cache]
+    if missing:
+        candidates = api.containers(all=True, filters={"name": missing})
+        for t in missing:
+            # Same rule as Docker's name filter (a regex searched in '/<name>'); like a single-name
+            # query, the first listed match wins
+            match = next((c for c in candidates if any(re.search(t, name) for name in c["Names"])), None)
+            if match is not None:
+                container_cache[t] = match
+    return [container_cache.get(t) for t in target_services]
+
+def forget_gone_containers(target_services: List[str]):
+    """Drop cached containers that no longer exist, so the next resolve_containers looks them up again"""
+    for t in target_services:
+        container = container_cache.get(t)
+        if container is None:
+            continue
+        try:
+            # keyed lookup by Id, much cheaper than listing containers
+            api.inspect_container(container["Id"])
+        except docker.errors.NotFound:
+            logger.warning("[WARN] Container for service '%s' is gone, looking it up again", t)
+            del container_cache[t]
 
 def get_container(target_service: str):
-    containers = client.containers.list(all=True, filters={"name": target_service})
-    return containers[0] if containers else None
+    return resolve_containers([target_service])[0]
+
+def refresh_container(target_service: str):
+    logger.warning("[WARN] Container for service '%s' is gone, looking it up again", target_service)
+    container_cache.pop(target_service, None)
+    return get_container(target_service)
 
 def stop_container(container, target_service: str):
     logger.info("[STOP] Stopping service '%s'", target_service)
-    container.stop()
+    try:
+        api.stop(container["Id"])
+    except docker.errors.NotFound:
+        container = refresh_container(target_service)
+        if container is not None:
+            api.stop(container["Id"])
 
 def start_container(container, target_service: str):
     logger.info("[STOP] Starting service '%s'", target_service)
-    container.start()
+    try:
+        api.start(container["Id"])
+    except docker.errors.NotFound:
+        container = refresh_container(target_service)
+        if container is not None:
+            api.start(container["Id"])
+
+def exec_run(container, cmd: str, tty: bool = False):
+    exec_id = api.exec_create(container["Id"], cmd, tty=tty)["Id"]
+    return api.exec_start(exec_id, tty=tty)
 
 def add_netem(container, target_service: str, duration_down: int):
     logger.info("[NET] Adding latency to service '%s'", target_service)
     try:
-        container.exec_run("tc qdisc add dev eth0 root netem delay 1000ms")
+        exec_run(container, "tc qdisc add dev eth0 root netem delay 1000ms")
         sleep(duration_down)
         logger.info("[NET] Removing latency from service '%s'", target_service)
-        container.exec_run("tc qdisc del dev eth0 root netem")
+        exec_run(container, "tc qdisc del dev eth0 root netem")
     except Exception as e:
         logger.error("[NET] Network emulation failed for service '%s': %s", target_service, e)
 
 def stress_cpu(container, target_service: str, duration_down: int):
     logger.info("[CPU] Stressing CPU on service '%s'", target_service)
     try:
-        container.exec_run(
+        exec_run(
+            container,
             "sh -c 'which stress || apk add --no-cache stress || apt-get update && apt-get install -y stress'",
             tty=True,
         )
-        container.exec_run(f"stress --cpu 1 --timeout {duration_down}", tty=True)
+        exec_run(container, f"stress --cpu 1 --timeout {duration_down}", tty=True)
     except Exception as e:
         logger.error("[CPU] CPU stress failed for service '%s': %s", target_service, e)
 
+async def run_stop_faults(containers, target_service: List[str], fault_mode: str, duration_up: int):
+    if fault_mode == "stop_once":
+        state.stop_once = StopOnceState(containers_to_stop=containers, services_to_stop=target_service, currentServiceIndex=0, stop_service_after_sec=duration_up)
+        inject_a_fault_once_after_s_seconds(state.stop_once)
+    else:
+        inject_a_fault_every_s_seconds(containers[0], target_service[0], duration_up)
+    # The scheduled steps chain themselves; wait until the process is told to stop
+    await asyncio.Event().wait()
+
 @app.command()
 def main(
     target_service: List[str] = typer.Option(..., "--target-service", help="Target container name. For stop_once fault mode, multiple services can be specified that are used in sequence."),
@@ -237,31 +326,21 @@ def main(
     seed(42)
 
     while True:
-        containers = []
-        for t in target_service:
-            container = get_container(t)
-            if not container:
-                logger.warning("[WARN] Target container '%s' not found. Retrying in 5 seconds...", target_service)
-                sleep(5)
-                continue
-            containers.append(container)
+        forget_gone_containers(target_service)
+        containers = resolve_containers(target_service)
+        not_found = [t for t, container in zip(target_service, containers) if container is None]
+        if not_found:
+            logger.warning("[WARN] Target container(s) %s not found. Retrying in 5 seconds...", not_found)
+            sleep(5)
+            continue
 
         try:
             if fault_mode == "stop" or fault_mode == "stop_once":
-                scheduler.start()
-                if fault_mode == "stop_once":
-                    global stop_once_state
-                    stop_once_state = StopOnceState(containers_to_stop=containers, services_to_stop=target_service, currentServiceIndex=0, stop_service_after_sec=duration_up)
-                    inject_a_fault_once_after_s_seconds(stop_once_state)
-                else:
-                    inject_a_fault_every_s_seconds(containers[0], target_service[0], duration_up)
-                # Block main thread indefinitely
                 try:
-                    while True:
-                        sleep(1)
+                    asyncio.run(run_stop_faults(containers, target_service, fault_mode, duration_up))
                 except (KeyboardInterrupt, SystemExit):
+                    # asyncio.run has cancelled the pending steps by now
                     logger.info("Shutting down scheduler")
-                    scheduler.shutdown()
                     sys.exit(0)
             elif fault_mode == "net":
                 add_netem(containers[0], target_service[0], duration_down)
@@ -1,41 +1,119 @@
-from fastapi import FastAPI, HTTPException, Header
-from pydantic import BaseModel
+from fastapi import FastAPI, HTTPException
+from fastapi.exceptions import RequestValidationError
+from fastapi.requests import Request
+from fastapi.responses import JSONResponse, ORJSONResponse, Response
+from pydantic import BaseModel, ValidationError
 import aiomqtt
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+import queue
+import atexit
 import os
+import time
 import json
+import socket
 from typing import Tuple, Optional
 import uvicorn
 from contextlib import asynccontextmanager
 
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
 # Configure logging
-if not os.path.exists('logs'):
-    os.makedirs('logs')
+os.makedirs('logs', exist_ok=True)
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
+logger.setLevel(os.getenv('LOG_LEVEL', 'DEBUG').upper())
 
 uvicorn_logger = logging.getLogger("uvicorn")
 uvicorn_logger.setLevel(logging.INFO)
 
+class BufferedRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler for the log listener thread: each record is formatted once and
+    written without a flush, so a burst reaches the file in a few large writes"""
+    _size = 0
+
+    def _open(self):
+        stream = super()._open()
+        # the rollover check counts from the file's size at (re)open, which also covers
+        # doRollover; stream.tell() per record would make the text stream flush its buffer
+        self._size = stream.tell()
+        return stream
+
+    def emit(self, record):
+        try:
+            msg = self.format(record) + self.terminator
+            if self.stream is None:
+                self.stream = self._open()
+            # the base class formats each record a second time and stats and seeks
+            # the file just to decide on a rollover
+            # count encoded bytes, not characters, so non-ASCII records can't push the
+            # file past maxBytes; ASCII lines skip the extra encode
+            size = len(msg) if msg.isascii() else len(msg.encode(self.encoding or 'utf-8', self.errors or 'strict'))
+            if self.maxBytes > 0 and self._size + size >= self.maxBytes:
+                self.doRollover()
+            self.stream.write(msg)
+            self._size += size
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+class FlushingQueueListener(QueueListener):
+    """QueueListener that flushes its handlers' buffers whenever the queue runs empty"""
+
+    def dequeue(self, block):
+        if block and self.queue.empty():
+            for h in self.handlers:
+                h.flush()
+        return self.queue.get(block)
+
+class CachedTimeFormatter(logging.Formatter):
+    """Formatter that renders the date part of asctime once per second instead of once per record"""
+    _cache = (None, '')
+
+    def formatTime(self, record, datefmt=None):
+        if datefmt:
+            return super().formatTime(record, datefmt)
+        second = int(record.created)
+        cached_second, stamp = self._cache
+        if second != cached_second:
+            stamp = time.strftime(self.default_time_format, self.converter(second))
+            self._cache = (second, stamp)
+        return self.default_msec_format % (stamp, record.msecs)
+
 file_name = f'logs/{os.getenv("SERVICE_NAME", "legacy_proxy_1")}.log'
-handler = RotatingFileHandler(
+handler = BufferedRotatingFileHandler(
     file_name,
     maxBytes=100*1024*1024,  # 100MB
     backupCount=5
 )
-formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+formatter = CachedTimeFormatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 handler.setFormatter(formatter)
 
-logger.addHandler(handler)
-uvicorn_logger.addHandler(handler)
+# Request handlers only enqueue records; a background thread formats them and
+# writes the rotating file, so file I/O never blocks the event loop
+log_queue = queue.Queue(-1)
+queue_handler = QueueHandler(log_queue)
+log_listener = FlushingQueueListener(log_queue, handler)
+log_listener.start()
+atexit.register(log_listener.stop)
+
+logger.addHandler(queue_handler)
+uvicorn_logger.addHandler(queue_handler)
 
 # Get configuration from environment variables with defaults
 MQTT_BROKER = os.getenv('MQTT_BROKER', 'localhost')
 MQTT_PORT = int(os.getenv('MQTT_PORT', '1883'))
 MQTT_TOPIC = os.getenv('MQTT_TOPIC', 'default/topic')
 CLIENT_ID = os.getenv("SERVICE_NAME", "legacy_proxy_1")
+# QoS 2 publishes of concurrent requests already overlap on the one connection, up to this
+# many in flight (paho's default is 20); the rest wait in paho's queue for a free slot.
+# Raise it when the broker's receive maximum allows.
+MQTT_MAX_INFLIGHT = int(os.getenv('MQTT_MAX_INFLIGHT', '20'))
 
 # Global MQTT client instance
 mqtt_client: Optional[aiomqtt.Client] = None
@@ -52,7 +130,10 @@ async def lifespan(app: FastAPI):
         port=MQTT_PORT,
         identifier=CLIENT_ID,
         clean_start=False,  # Persistent session for MQTT5
-        protocol=aiomqtt.ProtocolVersion.V5
+        protocol=aiomqtt.ProtocolVersion.V5,
+        max_inflight_messages=MQTT_MAX_INFLIGHT,
+        # PUBREL and friends are tiny; don't let Nagle hold them back waiting for an ACK
+        socket_options=[(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)]
     )
     
     try:
@@ -70,7 +151,9 @@ async def lifespan(app: FastAPI):
 app = FastAPI(
     title="Legacy Proxy I",
     description="HTTP to MQTT bridge service",
-    lifespan=lifespan
+    lifespan=lifespan,
+    # ORJSONResponse asserts that orjson is installed when rendering
+    default_response_class=ORJSONResponse if ORJSON_AVAILABLE else JSONResponse
 )
 
 class Message(BaseModel):
@@ -78,7 +161,19 @@ class Message(BaseModel):
     id: str
     body: str
 
-async def publish_to_mqtt(message: str) -> Tuple[bool, str]:
+def dump_json(json_object) -> bytes:
+    """Serialize to compact UTF-8 JSON, with orjson when it is installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(json_object)
+    return json.dumps(json_object, ensure_ascii=False, separators=(",", ":"), allow_nan=False).encode("utf-8")
+
+# The endpoint's fixed reply, serialized once instead of on every request
+SUCCESS_BODY = dump_json({
+    "status": "success",
+    "message": "Data published to MQTT"
+})
+
+async def publish_to_mqtt(message: bytes) -> Tuple[bool, str]:
     """
     Asynchronously publish a message to MQTT broker with QoS 2.
     
@@ -107,47 +202,77 @@ async def publish_to_mqtt(message: str) -> Tuple[bool, str]:
         logger.error(error_msg)
         return False, error_msg
 
-@app.post("/ID_REQ_KC_STORE7D3BPACKET")
-async def receive_message(message: Message, request_id: Optional[str] = Header(default=None)):
+async def get_message_from_body(request: Request) -> Message:
+    raw_body = await request.body()
+    if not raw_body:
+        raise RequestValidationError([{"type": "missing", "loc": ("body",), "msg": "Field required", "input": None}])
+    try:
+        # one pass from JSON bytes to the model in pydantic-core, without an
+        # intermediate dict from json.loads
+        return Message.model_validate_json(raw_body)
+    except ValidationError as e:
+        raise RequestValidationError([{**err, "loc": ("body", *err["loc"])}
+                                      for err in e.errors(include_url=False)])
+
+
+async def receive_message(request: Request):
     """Handle incoming POST requests with JSON data."""
+    # Registered as a plain Starlette route (see below): body and header are read
+    # directly instead of through FastAPI's per-request dependency solver
+    message = await get_message_from_body(request)
+    request_id = request.headers.get('request-id')
     try:
-        # Convert message to JSON string
+        # Convert message to a JSON payload
         message_dict = {"id": message.id, "body": message.body}
         if request_id is not None:
             message_dict["request_id"] = request_id
-        message_str = json.dumps(message_dict)
+        payload = dump_json(message_dict)
        
-        logger.info(f"[{request_id}] Publishing message {message_str} to Broker ...")
+        # The payload is only rendered into the log line when DEBUG logging is on
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.info("[%s] Publishing message %s to Broker ...", request_id, message_dict)
+        else:
+            logger.info("[%s] Publishing message %s to Broker ...", request_id, message.id)
         # Publish to MQTT
-        success, error = await publish_to_mqtt(message_str)
+        success, error = await publish_to_mqtt(payload)
         
         if not success:
-            logger.error(f"[{request_id}] MQTT publish failed: {error}")
+            logger.error("[%s] MQTT publish failed: %s", request_id, error)
             raise HTTPException(
                 status_code=500,
                 detail=f"Failed to publish message: {error}"
             )
 
-        logger.info(f"[{request_id}] Successfully published message")
-        return {
-            "status": "success",
-            "message": "Data published to MQTT"
-        }
+        logger.info("[%s] Successfully published message", request_id)
+        return Response(SUCCESS_BODY, media_type="application/json")
 
     except Exception as e:
-        logger.error(f"[{request_id}] Error processing request: {str(e)}")
+        logger.error("[%s] Error processing request: %s", request_id, e)
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error: {str(e)}"
         )
 
+app.add_route("/ID_REQ_KC_STORE7D3BPACKET", receive_message, methods=["POST"])
+
 if __name__ == '__main__':
     port = int(os.getenv('HTTP_PORT', '8080'))
     host = os.getenv('HTTP_HOST', '0.0.0.0')
     
+    # A single worker only: every process would connect with the same CLIENT_ID and
+    # clean_start=False, so the broker would keep handing the session from one to the
+    # other, and all of them would write and rotate the same log file
+    if int(os.getenv('WORKERS', '1')) > 1:
+        logger.warning("WORKERS > 1 is not supported by this service, starting a single worker")
+    
     logger.info(f"Starting server on {host}:{port}")
     logger.info(f"MQTT broker configured at {MQTT_BROKER}:{MQTT_PORT}")
     logger.info(f"Publishing to topic: {MQTT_TOPIC}")
     
-    uvicorn.run(app, host=host, port=port, log_config=None)
+    uvicorn.run(app, host=host, port=port, log_config=None,
+                # one access line per request on top of our own request logs
+                access_log=False,
+                # uvicorn[standard] ships both; pin them so a broken install fails
+                # loudly instead of silently falling back to asyncio/h11
+                loop="uvloop", http="httptools")
 
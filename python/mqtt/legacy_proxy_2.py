@@ -2,36 +2,93 @@ import os
 import sys
 import signal
 import logging
+import queue
+import atexit
 import json
 from typing import Any, Optional
 import paho.mqtt.client as mqtt
 from paho.mqtt.enums import MQTTProtocolVersion, MQTTErrorCode
+from paho.mqtt.packettypes import PacketTypes
 from paho.mqtt.properties import Properties
 from paho.mqtt.reasoncodes import ReasonCode
 import httpx
-from httpx import HTTPStatusError, RequestError
-from logging.handlers import RotatingFileHandler
-import time
+from httpx import RequestError
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 import socket
-from urllib.parse import urlparse
+import time
+import random
+import threading
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
 
 # Configure logging
-if not os.path.exists('logs'):
-    os.makedirs('logs')
+os.makedirs('logs', exist_ok=True)
 
 logger = logging.getLogger(__name__)
-logger.setLevel(logging.DEBUG)
+logger.setLevel(os.getenv('LOG_LEVEL', 'DEBUG').upper())
+
+class BufferedRotatingFileHandler(RotatingFileHandler):
+    """RotatingFileHandler for the log listener thread: each record is formatted once and
+    written without a flush, so a burst reaches the file in a few large writes"""
+    _size = 0
+
+    def _open(self):
+        stream = super()._open()
+        # the rollover check counts from the file's size at (re)open, which also covers
+        # doRollover; stream.tell() per record would make the text stream flush its buffer
+        self._size = stream.tell()
+        return stream
+
+    def emit(self, record):
+        try:
+            msg = self.format(record) + self.terminator
+            if self.stream is None:
+                self.stream = self._open()
+            # the base class formats each record a second time and stats and seeks
+            # the file just to decide on a rollover
+            # count encoded bytes, not characters, so non-ASCII records can't push the
+            # file past maxBytes; ASCII lines skip the extra encode
+            size = len(msg) if msg.isascii() else len(msg.encode(self.encoding or 'utf-8', self.errors or 'strict'))
+            if self.maxBytes > 0 and self._size + size >= self.maxBytes:
+                self.doRollover()
+            self.stream.write(msg)
+            self._size += size
+        except RecursionError:
+            raise
+        except Exception:
+            self.handleError(record)
+
+class FlushingQueueListener(QueueListener):
+    """QueueListener that flushes its handlers' buffers whenever the queue runs empty"""
+
+    def dequeue(self, block):
+        if block and self.queue.empty():
+            for h in self.handlers:
+                h.flush()
+        return self.queue.get(block)
 
 SERVICE_NAME = os.getenv("SERVICE_NAME", "legacy_proxy_2")
 file_name = f'logs/{SERVICE_NAME}.log'
-handler = RotatingFileHandler(
+handler = BufferedRotatingFileHandler(
     file_name,
     maxBytes=100*1024*1024,  # 100MB
     backupCount=5
 )
 formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 handler.setFormatter(formatter)
-logger.addHandler(handler)
+
+# The paho network thread only enqueues records; a background thread formats
+# them and writes the rotating file, so file I/O never delays message handling
+log_queue = queue.Queue(-1)
+queue_handler = QueueHandler(log_queue)
+log_listener = FlushingQueueListener(log_queue, handler)
+log_listener.start()
+atexit.register(log_listener.stop)
+logger.addHandler(queue_handler)
 
 # Get configuration from environment variables
 MQTT_HOST = os.getenv('MQTT_HOST', 'localhost')
@@ -41,57 +98,67 @@ MQTT_RETRY_TOPIC_PUB = f'{SERVICE_NAME}/retry/message'
 MQTT_RETRY_TOPIC_SUB = '$share/legacy_proxy/+/retry/message'
 MQTT_QOS = int(os.getenv('MQTT_QOS', '2'))  # QoS level 2 by default
 TARGET_URL = os.getenv('TARGET_URL', 'http://localhost:8080/ID_REQ_KC_STORE7D3BPACKET')
+# paho logs every packet at DEBUG; its records go to a child logger that only passes WARNING and up by default
+MQTT_CLIENT_LOG_LEVEL = os.getenv('MQTT_CLIENT_LOG_LEVEL', 'WARNING').upper()
+# In-flight QoS>0 window in both directions: paho's limit on our own publishes (the retry republish) and the
+# Receive Maximum sent on CONNECT, which caps unacked deliveries from any MQTT 5 broker (HiveMQ included).
+# The consumer is deliberately serial, so it stays 1 by default
+MQTT_MAX_INFLIGHT = int(os.getenv('MQTT_MAX_INFLIGHT', '1'))
+# Upper bound in seconds for the ack delay after a failed forward; the delay starts at 1s and doubles per consecutive failure
+RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', '30'))
+
+# DNS cache for getaddrinfo lookups, keyed by the full call so the hostname stays in TARGET_URL.
+# Entries expire after DNS_CACHE_TTL seconds so a target that comes back with a new IP is found on reconnect.
+DNS_CACHE_TTL = float(os.getenv('DNS_CACHE_TTL', '60'))
+dns_cache: dict[tuple, tuple[list, float]] = {}
+_orig_getaddrinfo = socket.getaddrinfo
+
+def cached_getaddrinfo(host, port, *args, **kwargs):
+    """socket.getaddrinfo that caches each (host, port, family, ...) result for DNS_CACHE_TTL seconds"""
+    key = (host, port, args, tuple(sorted(kwargs.items())))
+    entry = dns_cache.get(key)
+    now = time.monotonic()
+    if entry is not None and entry[1] > now:
+        return entry[0]
+    result = _orig_getaddrinfo(host, port, *args, **kwargs)
+    dns_cache[key] = (result, now + DNS_CACHE_TTL)
+    logger.info("DNS resolved %s:%s -> %s", host, port, sorted({info[4][0] for info in result}))
+    return result
+
+# Skip DNS caching if environment variable is set
+if os.getenv('SKIP_DNS_CACHE', '').lower() not in ('1', 'true', 'yes'):
+    socket.getaddrinfo = cached_getaddrinfo
 
-# DNS cache for hostname to IP resolution
-dns_cache = {}
-
-def resolve_hostname_to_ip(url: str) -> str:
-    """Resolve hostname in URL to IP address, cache the result"""
-    parsed = urlparse(url)
-    hostname = parsed.hostname
-
-    # Skip DNS caching if environment variable is set
-    if os.getenv('SKIP_DNS_CACHE', '').lower() in ('1', 'true', 'yes'):
-        return url
-    
-    if hostname in dns_cache:
-        logger.debug(f"DNS cache hit for {hostname} -> {dns_cache[hostname]}")
-        return url.replace(hostname, dns_cache[hostname])
-    
-    try:
-        # Resolve hostname to IP
-        ip_address = socket.gethostbyname(hostname)
-        dns_cache[hostname] = ip_address
-        logger.info(f"DNS resolved {hostname} -> {ip_address}")
-        return url.replace(hostname, ip_address)
-    except socket.gaierror as e:
-        logger.warning(f"DNS resolution failed for {hostname}: {e}. Using original URL.")
-        return url
+def load_json(data: bytes) -> Any:
+    """Parse a JSON payload straight from bytes, with orjson when it is installed"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)  # raises orjson.JSONDecodeError, a json.JSONDecodeError subclass
+    return json.loads(data)
 
 # HTTP client will be initialized in MQTTToHTTPForwarder
 httpclient: httpx.Client = None
-resolved_target_url = ""
 
 class MQTTToHTTPForwarder:
     def __init__(self):
-        global httpclient, resolved_target_url
-        
-        # Resolve DNS and create HTTP client
-        resolved_target_url = resolve_hostname_to_ip(TARGET_URL)
+        global httpclient
         
+        # Create HTTP client; DNS lookups for TARGET_URL go through cached_getaddrinfo
         use_http2 = os.getenv('USE_HTTP_2', '').lower() in ('1', 'true', 'yes')
         
         httpclient = httpx.Client(
             http2=use_http2,  # use http2 here because ARS_Comp_2 use HTTP2.
             http1=not use_http2,  # set to false to force http2 over plain text. Disabling http1 here, deactivates HTTP 1.1 Upgrade to HTTP 2.0
             timeout=httpx.Timeout(60.0),  # 60 second timeout
+            # Every body is the received JSON payload; as a client default this header isn't rebuilt per request
+            headers={"Content-Type": "application/json"},
+            # Messages are forwarded one at a time, so a small pool is all this consumer can use
             limits=httpx.Limits(
-                max_keepalive_connections=100,
-                max_connections=None,  # No limit
-                keepalive_expiry=30.0
+                max_keepalive_connections=4,
+                max_connections=4,
+                keepalive_expiry=30.0  # below ARS Comp 2's 60s server keep-alive, so a socket it closed is never reused
             )
         )
-        logger.info(f"HTTP client initialized with resolved URL: {resolved_target_url}, HTTP/2: {use_http2}")
+        logger.info("HTTP client initialized with URL: %s, HTTP/2: %s", TARGET_URL, use_http2)
         
         self.client = mqtt.Client(
                 client_id=os.getenv("SERVICE_NAME", "legacy_proxy_2"), 
@@ -102,73 +169,135 @@ class MQTTToHTTPForwarder:
         self.client.on_subscribe = self.on_subscribe
         self.client.on_message = self.on_message
         self.client.on_disconnect = self.on_disconnect
-        self.client.enable_logger(logger)
+        self.client.on_socket_open = self.on_socket_open
+        paho_logger = logger.getChild('paho')
+        paho_logger.setLevel(MQTT_CLIENT_LOG_LEVEL)
+        self.client.enable_logger(paho_logger)
         self.running = False
         self.is_in_retry_mode = False
+        self.retry_count = 0
+        # Acks are sent in the order messages were received (MQTT 5 section 4.6); once an ack
+        # is delayed, the acks after it queue up behind it on this single thread
+        self.ack_queue = queue.Queue()
+        self.ack_lock = threading.Lock()
+        self.acks_pending = 0
+        threading.Thread(target=self.send_queued_acks, daemon=True).start()
+
+    def on_socket_open(self, client: mqtt.Client, userdata: Any, sock: Any) -> None:
+        """Callback for when the broker connection's socket is opened, before CONNECT is sent."""
+        # PUBREC/PUBCOMP and acks are tiny; don't let Nagle hold them back waiting for an ACK
+        if isinstance(sock, socket.socket):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
 
     def on_connect(self, client: mqtt.Client, userdata: Any, flags: dict, rc: ReasonCode, properties: Optional[Properties]) -> None:
         """Callback for when the client connects to the broker."""
         if rc == 0:
-            logger.info(f"Connected to MQTT broker at {MQTT_HOST}:{MQTT_PORT}")
-            logger.info(f"CONNECT response: rc={rc}, flags={flags}")
+            logger.info("Connected to MQTT broker at %s:%s", MQTT_HOST, MQTT_PORT)
+            logger.info("CONNECT response: rc=%s, flags=%s", rc, flags)
             result, mid = self.client.subscribe(MQTT_TOPIC, qos=MQTT_QOS)
-            logger.info(f"Subscribed to topic: {MQTT_TOPIC} with QoS {MQTT_QOS}, result: {result}, mid: {mid}")
+            logger.info("Subscribed to topic: %s with QoS %s, result: %s, mid: %s", MQTT_TOPIC, MQTT_QOS, result, mid)
             result_retry, mid_retry = self.client.subscribe(MQTT_RETRY_TOPIC_SUB, qos=MQTT_QOS)
-            logger.info(f"Subscribed to topic: {MQTT_RETRY_TOPIC_SUB} with QoS {MQTT_QOS}, result: {result_retry}, mid: {mid_retry}")
+            logger.info("Subscribed to topic: %s with QoS %s, result: %s, mid: %s", MQTT_RETRY_TOPIC_SUB, MQTT_QOS, result_retry, mid_retry)
         else:
-            logger.error(f"Failed to connect to MQTT broker with code: {rc}")
+            logger.error("Failed to connect to MQTT broker with code: %s", rc)
 
     def on_subscribe(self, client: mqtt.Client, userdata: Any, mid: int, reason_codes: list[ReasonCode], properties: Optional[Properties]) -> None:
         """Callback for when the broker responds to a subscribe request."""
-        logger.info(f"SUBACK received for mid {mid}, reason_codes: {[str(rc) for rc in reason_codes]}")
+        logger.info("SUBACK received for mid %s, reason_codes: %s", mid, [str(rc) for rc in reason_codes])
         for i, rc in enumerate(reason_codes):
             if rc.is_failure:
-                logger.error(f"Subscription {i} failed with reason code: {rc}")
+                logger.error("Subscription %s failed with reason code: %s", i, rc)
             else:
-                logger.info(f"Subscription {i} granted with QoS: {rc}")
+                logger.info("Subscription %s granted with QoS: %s", i, rc)
 
     def on_message(self, client: mqtt.Client, userdata: Any, msg: mqtt.MQTTMessage) -> None:
         """Callback for when a message is received from the broker."""
 
         request_id = "N/A"
+        ack_delay = 0.0
         try:
-            payload = msg.payload.decode()
-            json_payload = json.loads(payload)
+            json_payload = load_json(msg.payload)
             request_id = json_payload["request_id"]
-            logger.info(f"[{request_id}] Received message {msg.mid} on topic {msg.topic} (QoS {msg.qos}, DUP {msg.dup}): {payload}")
+            # The payload is only decoded into the log line when DEBUG logging is on
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.info("[%s] Received message %s on topic %s (QoS %s, DUP %s): %s", request_id, msg.mid, msg.topic, msg.qos, msg.dup, msg.payload.decode())
+            else:
+                logger.info("[%s] Received message %s on topic %s (QoS %s, DUP %s, %s bytes)", request_id, msg.mid, msg.topic, msg.qos, msg.dup, len(msg.payload))
 
             headers = {"Request-Id": f"{request_id}"}
-            response = httpclient.post(resolved_target_url, headers=headers, json=json_payload)
-            logger.debug(f"[{request_id}] HTTP version: {response.http_version}")
-            response.raise_for_status()
-            logger.info(f"[{request_id}] Successfully forwarded message to {resolved_target_url}")
+            # The payload was just validated as JSON, so forward its bytes instead of re-encoding it
+            response = httpclient.post(TARGET_URL, headers=headers, content=msg.payload)
+            if not response.is_success:
+                logger.error("[%s] Failed to forward message to HTTP endpoint: HTTP %s from %s", request_id, response.status_code, TARGET_URL)
+                ack_delay = self.publish_for_retry(client, msg)
+                return
+            logger.info("[%s] Successfully forwarded message to %s", request_id, TARGET_URL)
             
             if self.is_in_retry_mode:
                 # self.client.subscribe(MQTT_TOPIC, qos=MQTT_QOS)
                 # logger.info(f"Subscribed to topic: {MQTT_TOPIC} with QoS {MQTT_QOS}")
                 self.is_in_retry_mode = False
+                self.retry_count = 0
 
         except json.JSONDecodeError as e:
-            logger.error(f"[{request_id}] Failed to decode message as JSON: {e}")
-        except (HTTPStatusError, RequestError) as e:
-            logger.error(f"[{request_id}] Failed to forward message to HTTP endpoint: {e}")
-            message = msg.payload
-            (rc, mid) = client.publish(
-                topic=MQTT_RETRY_TOPIC_PUB,
-                payload=message,
-                qos=msg.qos
-            )
-            if rc == MQTTErrorCode.MQTT_ERR_SUCCESS:
-                if not self.is_in_retry_mode:
-                    # client.unsubscribe(MQTT_TOPIC)
-                    self.is_in_retry_mode = True
-                time.sleep(1) # wait one second before sending ack to slow down this consumer in case the reason for the failure is not a short error.
+            logger.error("[%s] Failed to decode message as JSON: %s", request_id, e)
+        except RequestError as e:
+            logger.error("[%s] Failed to forward message to HTTP endpoint: %s", request_id, e)
+            ack_delay = self.publish_for_retry(client, msg)
         except Exception as e:
-            logger.error(f"[{request_id}] Unexpected error while processing message: {e}")
+            logger.error("[%s] Unexpected error while processing message: %s", request_id, e)
         finally:
             # An ack is send by the library automatically once this method returns and manual_ack is set to False. We send the ACK explicitly to allow changing the value of manual_ack without having to change the rest of the code for it to work.
-            logger.info(f"[{request_id}] Sending Ack for {msg.mid} with QoS {msg.qos}")
-            client.ack(msg.mid, qos=msg.qos)
+            if ack_delay:
+                logger.info("[%s] Sending Ack for %s with QoS %s in %.1fs", request_id, msg.mid, msg.qos, ack_delay)
+            else:
+                logger.info("[%s] Sending Ack for %s with QoS %s", request_id, msg.mid, msg.qos)
+            self.ack(client, msg, ack_delay)
+
+    def ack(self, client: mqtt.Client, msg: mqtt.MQTTMessage, delay: float) -> None:
+        """Acknowledge a message now, or after delay seconds, keeping acks in receipt order.
+
+        A held ack also holds back the next delivery, since Receive Maximum bounds the
+        unacked messages, without blocking paho's network thread.
+        """
+        with self.ack_lock:
+            if not delay and not self.acks_pending:
+                client.ack(msg.mid, qos=msg.qos)
+                return
+            self.acks_pending += 1
+            self.ack_queue.put((time.monotonic() + delay, client, msg.mid, msg.qos))
+
+    def send_queued_acks(self) -> None:
+        """Send queued acks in order, each no earlier than its due time."""
+        while True:
+            due, client, mid, qos = self.ack_queue.get()
+            wait = due - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            with self.ack_lock:
+                client.ack(mid, qos=qos)
+                self.acks_pending -= 1
+
+    def publish_for_retry(self, client: mqtt.Client, msg: mqtt.MQTTMessage) -> float:
+        """Republish a message that could not be forwarded to the retry topic.
+
+        Returns how long to hold back the ack, or 0 if the republish failed.
+        """
+        (rc, mid) = client.publish(
+            topic=MQTT_RETRY_TOPIC_PUB,
+            payload=msg.payload,
+            qos=msg.qos
+        )
+        if rc == MQTTErrorCode.MQTT_ERR_SUCCESS:
+            if not self.is_in_retry_mode:
+                # client.unsubscribe(MQTT_TOPIC)
+                self.is_in_retry_mode = True
+            # delay the ack to slow down this consumer in case the reason for the failure is not a short error;
+            # exponential backoff with jitter, reset once a message is forwarded again.
+            delay = min(RETRY_MAX_DELAY, 2 ** self.retry_count * random.uniform(1.0, 1.25))
+            self.retry_count = min(self.retry_count + 1, 16)
+            return delay
+        return 0.0
 
     def on_disconnect(self, client: mqtt.Client, userdata: Any, flags: mqtt.DisconnectFlags, rc: ReasonCode) -> None:
         """Callback for when the client disconnects from the broker."""
@@ -178,16 +307,19 @@ class MQTTToHTTPForwarder:
     def start(self) -> None:
         """Start the MQTT client and connect to the broker."""
         try:
-            self.client.max_inflight_messages_set(1)  # inflight window = 1
+            self.client.max_inflight_messages_set(MQTT_MAX_INFLIGHT)  # inflight window, 1 by default
+            connect_properties = Properties(PacketTypes.CONNECT)
+            connect_properties.ReceiveMaximum = MQTT_MAX_INFLIGHT  # the broker may not deliver more unacked messages than this
             self.client.connect(
                     MQTT_HOST, 
                     MQTT_PORT, 
-                    clean_start=False       # do not discard in-flight messages
+                    clean_start=False,      # do not discard in-flight messages
+                    properties=connect_properties
                     )
             self.running = True
             self.client.loop_start()
         except Exception as e:
-            logger.error(f"Failed to start MQTT client: {e}")
+            logger.error("Failed to start MQTT client: %s", e)
             sys.exit(1)
 
     def stop(self) -> None:
@@ -134,9 +134,34 @@ if $USE_GRANIAN; then
     HTTP_FLAG="--http 2"
   fi
 
-  echo "granian --interface asgi --host \"$HOST\" --port \"$PORT\" $HTTP_FLAG \"${SCRIPT_NAME}:app\""
+  # Worker processes (each with its own event loop) sharing the port
+  WORKERS="${WORKERS:-1}"
+
+  # legacy_proxy_1 holds a persistent MQTT session under a fixed client id and writes
+  # one log file: a second worker would take the session over from the running one
+  if [[ "$SCRIPT_NAME" == "legacy_proxy_1" && "$WORKERS" != "1" ]]; then
+    echo "Ignoring WORKERS=$WORKERS for $SCRIPT_NAME"
+    WORKERS=1
+  fi
+
+  # Optional worker recycling for long runs: granian respawns a worker after
+  # WORKERS_LIFETIME seconds (min. 60) or once its RSS exceeds WORKERS_MAX_RSS MiB
+  RECYCLE_FLAGS=""
+  if [[ -n "${WORKERS_LIFETIME}" ]]; then
+    RECYCLE_FLAGS="$RECYCLE_FLAGS --workers-lifetime ${WORKERS_LIFETIME}"
+  fi
+  if [[ -n "${WORKERS_MAX_RSS}" ]]; then
+    RECYCLE_FLAGS="$RECYCLE_FLAGS --workers-max-rss ${WORKERS_MAX_RSS}"
+  fi
+  # a respawned legacy_proxy_1 worker would briefly hold the same MQTT session as the one it replaces
+  if [[ "$SCRIPT_NAME" == "legacy_proxy_1" && -n "$RECYCLE_FLAGS" ]]; then
+    echo "Ignoring WORKERS_LIFETIME/WORKERS_MAX_RSS for $SCRIPT_NAME"
+    RECYCLE_FLAGS=""
+  fi
+
+  echo "granian --interface asgi --host \"$HOST\" --port \"$PORT\" --workers \"$WORKERS\"$RECYCLE_FLAGS $HTTP_FLAG \"${SCRIPT_NAME}:app\""
 
-  granian --interface asgi --host "$HOST" --port "$PORT" $HTTP_FLAG "${SCRIPT_NAME}:app"
+  granian --interface asgi --host "$HOST" --port "$PORT" --workers "$WORKERS"$RECYCLE_FLAGS $HTTP_FLAG "${SCRIPT_NAME}:app"
 else
   echo "Running univorn..."
   python "$1"